@@ -0,0 +1,171 @@
+"""
+Materialized per-user activity counters.
+
+Each counter table lives in the same DB file as the table it counts, since
+in split mode a trigger cannot write to another file. Rows are keyed by
+user_id; user_id 0 holds the global totals. INSERT/DELETE/UPDATE triggers
+keep them current, so read paths are single-row lookups.
+"""
+import logging
+
+logger = logging.getLogger("theramind")
+
+GLOBAL_ROW = 0
+
+# store -> which DB file; key -> column holding the user id (None: totals only)
+# columns -> counter name: per-row SQL expression over {row}
+COUNTERS = [
+    {
+        "store": "conv",
+        "table": "stats_conversations",
+        "source": "conversations",
+        "key": "user_id",
+        "columns": {"total": "1", "saved": "{row}.title != '__current__'"},
+        "update_of": ["user_id", "title"],
+    },
+    {
+        "store": "journal",
+        "table": "stats_journals",
+        "source": "journal_entries",
+        "key": "user_id",
+        "columns": {"total": "1"},
+        "update_of": ["user_id"],
+    },
+    {
+        "store": "mood",
+        "table": "stats_moods",
+        "source": "mood_logs",
+        "key": "user_id",
+        "columns": {"total": "1"},
+        "update_of": ["user_id"],
+    },
+    {
+        "store": "users",
+        "table": "stats_users",
+        "source": "users",
+        "key": None,
+        "columns": {"total": "1"},
+        "update_of": [],
+    },
+]
+
+
+def _apply_sql(spec, row, sign):
+    """UPSERT that adds (sign=+1) or removes (sign=-1) one source row."""
+    cols = list(spec["columns"])
+    exprs = [f"{sign} * ({spec['columns'][c].format(row=row)})" for c in cols]
+    keys = f"SELECT {GLOBAL_ROW} AS k"
+    if spec["key"]:
+        # rows without an owner (legacy, pre-backfill) only count globally;
+        # a NULL INTEGER PRIMARY KEY would silently become a new rowid
+        keys += f" UNION ALL SELECT {row}.{spec['key']}"
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in cols)
+    return (
+        f"INSERT INTO {spec['table']} (user_id, {', '.join(cols)}) "
+        f"SELECT k, {', '.join(exprs)} FROM ({keys}) WHERE k IS NOT NULL "
+        f"ON CONFLICT(user_id) DO UPDATE SET {updates};"
+    )
+
+
+def _actual_sql(spec):
+    """Recount from the source table: one row per user plus the totals row."""
+    src = spec["source"]
+    cols = list(spec["columns"])
+    sums = ", ".join(
+        f"COALESCE(SUM({spec['columns'][c].format(row=src)}), 0) AS {c}" for c in cols
+    )
+    sql = f"SELECT {GLOBAL_ROW} AS user_id, {sums} FROM {src}"
+    if spec["key"]:
+        sql += (
+            f" UNION ALL SELECT {spec['key']}, {sums} FROM {src}"
+            f" WHERE {spec['key']} IS NOT NULL GROUP BY {spec['key']}"
+        )
+    return sql
+
+
+def create_counters(conn, spec):
+    """
+    Create the counter table and its triggers; the first time the table is
+    created it is backfilled from the source table. Runs in the caller's
+    transaction (the schema migration runner's).
+    """
+    table = spec["table"]
+    cols = list(spec["columns"])
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {table} ("
+        "user_id INTEGER PRIMARY KEY, "
+        + ", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in cols)
+        + ")"
+    )
+    if not existed:
+        conn.execute(
+            f"INSERT INTO {table} (user_id, {', '.join(cols)}) {_actual_sql(spec)}"
+        )
+
+    # Triggers are recreated so a changed definition replaces the old one
+    src = spec["source"]
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {src} BEGIN "
+        f"{_apply_sql(spec, 'new', 1)} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {src} BEGIN "
+        f"{_apply_sql(spec, 'old', -1)} END"
+    )
+    if spec["update_of"]:
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_au "
+            f"AFTER UPDATE OF {', '.join(spec['update_of'])} ON {src} BEGIN "
+            f"{_apply_sql(spec, 'old', -1)} {_apply_sql(spec, 'new', 1)} END"
+        )
+
+
+def ensure_counters(conn, spec):
+    """create_counters() in its own IMMEDIATE transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        create_counters(conn, spec)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def check_counters(conn, spec):
+    """Return [(user_id, column, stored, actual), ...] for every drifted counter."""
+    table = spec["table"]
+    cols = list(spec["columns"])
+    stored = {
+        r[0]: r[1:]
+        for r in conn.execute(f"SELECT user_id, {', '.join(cols)} FROM {table}")
+    }
+    mismatches = []
+    for row in conn.execute(_actual_sql(spec)).fetchall():
+        have = stored.pop(row[0], (0,) * len(cols))
+        for col, got, want in zip(cols, have, row[1:]):
+            if got != want:
+                mismatches.append((row[0], col, got, want))
+    # Users with stored counts but no source rows left
+    for user_id, have in stored.items():
+        for col, got in zip(cols, have):
+            if got != 0:
+                mismatches.append((user_id, col, got, 0))
+    return mismatches
+
+
+def rebuild_counters(conn, spec):
+    table = spec["table"]
+    cols = list(spec["columns"])
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} (user_id, {', '.join(cols)}) {_actual_sql(spec)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
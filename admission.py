@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable)
+MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "16"))
+MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "2"))
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "4"))
+
+
+class AdmissionRejected(RuntimeError):
+    """No LLM slot freed up before the caller's queue deadline."""
+
+
+class AdmissionController:
+    """
+    Per-worker admission control for OpenRouter calls: at most MAX_INFLIGHT
+    calls at once and MAX_PER_USER per user. A caller over either limit
+    waits until a slot frees up or its queue timeout passes, and is then
+    shed (AdmissionRejected) so it can serve a fast degraded reply.
+
+    Priority callers (crisis or panic messages) never wait: they are
+    admitted immediately, even above the limits.
+    """
+
+    def __init__(self, max_inflight=MAX_INFLIGHT, max_per_user=MAX_PER_USER):
+        self.max_inflight = max(1, max_inflight)
+        self.max_per_user = max(1, max_per_user)
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._waiting = 0
+        self._per_user = {}
+        self._stats = {
+            "admitted": 0,
+            "priority": 0,
+            "queued": 0,
+            "shed": 0,
+            "max_wait_ms": 0.0,
+        }
+
+    def _has_room(self, user_id):
+        if self._inflight >= self.max_inflight:
+            return False
+        return user_id is None or self._per_user.get(user_id, 0) < self.max_per_user
+
+    def acquire(self, user_id=None, priority=False, timeout=QUEUE_TIMEOUT):
+        with self._cond:
+            if priority:
+                self._stats["priority"] += 1
+            elif not self._has_room(user_id):
+                self._stats["queued"] += 1
+                self._waiting += 1
+                started = time.monotonic()
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self._has_room(user_id), max(0.0, timeout)
+                    )
+                finally:
+                    self._waiting -= 1
+                waited_ms = (time.monotonic() - started) * 1000.0
+                self._stats["max_wait_ms"] = round(max(self._stats["max_wait_ms"], waited_ms), 2)
+                if not admitted:
+                    self._stats["shed"] += 1
+                    raise AdmissionRejected(
+                        f"no LLM slot within {timeout:.1f}s "
+                        f"({self._inflight} in flight, user {user_id})"
+                    )
+            self._inflight += 1
+            if user_id is not None:
+                self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            self._stats["admitted"] += 1
+
+    def release(self, user_id=None):
+        with self._cond:
+            self._inflight -= 1
+            if user_id is not None:
+                left = self._per_user.get(user_id, 0) - 1
+                if left > 0:
+                    self._per_user[user_id] = left
+                else:
+                    self._per_user.pop(user_id, None)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            out = dict(self._stats)
+            out["inflight"] = self._inflight
+            out["waiting"] = self._waiting
+            out["max_inflight"] = self.max_inflight
+            out["max_per_user"] = self.max_per_user
+        return out
+
+
+# ======================================================
+# Per-worker instance
+# ======================================================
+_controller = AdmissionController()
+
+
+@contextmanager
+def llm_slot(user_id=None, priority=False, timeout=QUEUE_TIMEOUT):
+    """Hold one OpenRouter call slot; raises AdmissionRejected when shed."""
+    controller = _controller
+    controller.acquire(user_id, priority, timeout)
+    try:
+        yield
+    finally:
+        controller.release(user_id)
+
+
+def admission_stats():
+    return _controller.stats()
+
+
+def _reset_after_fork():
+    global _controller
+    _controller = AdmissionController()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
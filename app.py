@@ -1,22 +1,44 @@
 from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import io
 import re
+import csv
+import html
 import json
+import zlib
 import time
-import math
+import zipfile
 import random
 import sqlite3
 import logging
 import datetime
-import requests
 from dotenv import load_dotenv
+from requests import HTTPError
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 from authlib.integrations.flask_client import OAuth
 from email_utils import send_otp_email
+from db_pool import get_pool, pool_stats
+from activity_stats import GLOBAL_ROW
+from migrations import db_dir, migrate
+from write_queue import defer_write, flush_writes, write_queue_stats
+from llm_client import llm_post, llm_client_stats, record_usage
+from summary_queue import SummaryQueue
+from context_packer import pack_messages, context_stats
+from circuit_breaker import (
+    CircuitOpenError, adaptive_timeout, circuit_allow, circuit_failure,
+    circuit_stats, circuit_success,
+)
+from admission import QUEUE_TIMEOUT as LLM_QUEUE_TIMEOUT, AdmissionRejected, admission_stats, llm_slot
+from deadline import MIN_ATTEMPT_SECONDS, Deadline, DeadlineExceeded, stage
+from history_blob import explode_history_blob
+from idempotency import PENDING, IdempotencyStore, valid_key
+from memory_store import MEMORY_MAX_PER_CONV, search_memories, store_memory
+from user_memory import remember, search_user_memories, user_memory_stats
 
 from flask import (
-    Flask, render_template, request, jsonify, session, Response, g, redirect, url_for, flash
+    Flask, render_template, request, jsonify, session, Response, g, redirect, url_for, flash,
+    stream_with_context
 )
 from flask_cors import CORS
 from flask_wtf import CSRFProtect
@@ -28,12 +50,15 @@ from flask_limiter.util import get_remote_address
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "theramind-secret-key")
-DB_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_DIR = db_dir()
 
 # Admin seeding env vars
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")  # MUST be set in production
 
+# New user turns needed before a conversation's memory summary is refreshed
+SUMMARY_EVERY_TURNS = int(os.getenv("SUMMARY_EVERY_TURNS", "6"))
+
 
 # -------------------- App --------------------
 app = Flask(__name__, template_folder="templates", static_folder="static")
@@ -95,217 +120,103 @@ logger.setLevel(logging.INFO)
 # ======================================================
 # DB paths & helpers
 # ======================================================
-CONV_DB = os.path.join(DB_DIR, "conversations.db")
-JOURNAL_DB = os.path.join(DB_DIR, "journal.db")
-MOOD_DB = os.path.join(DB_DIR, "mood_data.db")
-USER_DB = os.path.join(DB_DIR, "users.db")  # new DB for user/auth
+# DB_MODE=split keeps one file per store; DB_MODE=single puts every table
+# in theramind.db so foreign keys (and their cascades) can actually fire.
+# Convert existing files with migrate_merge_databases.py.
+DB_MODE = os.getenv("DB_MODE", "split").lower()
+MAIN_DB = os.path.join(DB_DIR, "theramind.db")
+
+if DB_MODE == "single":
+    CONV_DB = JOURNAL_DB = MOOD_DB = USER_DB = MAIN_DB
+else:
+    CONV_DB = os.path.join(DB_DIR, "conversations.db")
+    JOURNAL_DB = os.path.join(DB_DIR, "journal.db")
+    MOOD_DB = os.path.join(DB_DIR, "mood_data.db")
+    USER_DB = os.path.join(DB_DIR, "users.db")  # new DB for user/auth
 
 def now():
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def connect_for_setup(db_path):
-    """Open a bare connection for setup/migration"""
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def get_db(db_path):
     """
-    Get (and cache in flask.g) a sqlite connection for this DB.
+    Get (and cache in flask.g) a pooled sqlite connection for this DB.
+    The connection goes back to the per-worker pool on teardown.
     """
     key = f"db_{os.path.basename(db_path)}"
     if not hasattr(g, key):
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-
-        # 🔹 Enable foreign key enforcement (required for ON DELETE CASCADE)
-        conn.execute("PRAGMA foreign_keys = ON")
+        pool = get_pool(db_path)
+        setattr(g, key, (pool, pool.acquire()))
 
-        setattr(g, key, conn)
+    return getattr(g, key)[1]
 
-    return getattr(g, key, None)
+def get_joined_db():
+    """
+    Get a connection that sees every store's tables, for cross-store reads.
+    In single mode that is just the main DB; in split mode it is a users.db
+    connection with the other files ATTACHed. Table names are unique across
+    stores, so the same unqualified SQL works in both modes.
+    """
+    if DB_MODE == "single":
+        return get_db(MAIN_DB)
+    if not hasattr(g, "db_joined"):
+        pool = get_pool(
+            USER_DB,
+            attach={"conv": CONV_DB, "journal": JOURNAL_DB, "mood": MOOD_DB},
+        )
+        setattr(g, "db_joined", (pool, pool.acquire()))
+    return g.db_joined[1]
 
 @app.teardown_appcontext
 def close_dbs(exception=None):
     """
-    Close any cached DB connections on appcontext teardown.
+    Return any cached DB connections to their pool on appcontext teardown.
+    Uncommitted work is rolled back by the pool.
+    """
+    release_dbs()
+
+def release_dbs():
+    """
+    Hand this request's cached connections back to the pool now; get_db()
+    acquires again if needed. Called before slow network waits (OpenRouter)
+    so threaded workers do not pin pool connections while idle.
     """
     for attr in list(g.__dict__.keys()):
         if attr.startswith("db_"):
-            conn = getattr(g, attr)
+            pool, conn = getattr(g, attr)
             try:
-                conn.close()
+                pool.release(conn)
             except Exception:
-                logger.exception("Error closing DB connection")
+                logger.exception("Error releasing DB connection")
             delattr(g, attr)
 
 # ======================================================
 # Database setup (including users table)
 # ======================================================
-def setup_conversations_db():
-    conn = connect_for_setup(CONV_DB)
-    c = conn.cursor()
-
-    # Main conversations table
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS conversations (
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               user_id INTEGER NOT NULL,
-               title TEXT NOT NULL,
-               history TEXT NOT NULL,
-               created_at TEXT NOT NULL,
-               FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-           )"""
-    )
-
-    # 🔹 INDEX for fast per-user queries (IMPORTANT)
-    c.execute(
-        "CREATE INDEX IF NOT EXISTS idx_conv_user ON conversations(user_id)"
-    )
-
-    conn.commit()
-    conn.close()
-
+DB_FOR_STORE = {"users": USER_DB, "mood": MOOD_DB, "journal": JOURNAL_DB, "conv": CONV_DB}
 
 def setup_databases():
-    # mood_data
-    conn = connect_for_setup(MOOD_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS mood_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT,
-            mood TEXT,
-            message TEXT,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    """)
-    c.execute("CREATE INDEX IF NOT EXISTS idx_mood_user ON mood_logs(user_id)")
-    conn.commit()
-    conn.close()
-
-    # journal
-    conn = connect_for_setup(JOURNAL_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS journal_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT,
-            content TEXT,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    """)
-    c.execute("CREATE INDEX IF NOT EXISTS idx_journal_user ON journal_entries(user_id)")
-    conn.commit()
-    conn.close()
-
-    # conversations + rest
-    setup_conversations_db()
-    setup_users_db()
-    setup_user_profile()
-    setup_otp_table()
-    
-    conn = connect_for_setup(USER_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS admin_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            admin_id INTEGER,
-            action TEXT,
-            target_user_id INTEGER,
-            timestamp TEXT
-             )
-    """)
-    conn.commit()
-    conn.close()
-    
-    
-
-
-    # memories table for short summaries
-    conn = connect_for_setup(CONV_DB)
-    c = conn.cursor()
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS memories (
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               conv_id INTEGER NOT NULL,
-               summary TEXT,
-               updated_at TEXT,
-               FOREIGN KEY (conv_id) REFERENCES conversations(id) ON DELETE CASCADE
-           )"""
-    )
-    conn.commit()
-    conn.close()
-
-
-
-def setup_users_db():
-    conn = connect_for_setup(USER_DB)
-    c = conn.cursor()
-
-    # Create table with auth_provider included
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            display_name TEXT,
-            intent TEXT,
-            auth_provider TEXT DEFAULT 'email',
-            email_verified INTEGER DEFAULT 0,
-            is_admin INTEGER DEFAULT 0,
-            created_at TEXT NOT NULL,
-            last_login TEXT
-        )
-    """)
-
-    # Ensure column exists (for older DB versions)
-    c.execute("PRAGMA table_info(users)")
-    columns = [col[1] for col in c.fetchall()]
-
-    if "auth_provider" not in columns:
-        c.execute("ALTER TABLE users ADD COLUMN auth_provider TEXT DEFAULT 'email'")
-
-    # Add useful indexes
-    c.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)")
-
-    conn.commit()
-    conn.close()
+    """
+    Bring every DB file to the latest schema version (see migrations.py).
+    Once a file is current this is a single version check, so worker boot
+    stays cheap. Backfills run separately: `python migrations.py`.
+    """
+    migrate(DB_FOR_STORE)
 
-def setup_user_profile():
-    conn = connect_for_setup(USER_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS user_profile (
-            user_id INTEGER PRIMARY KEY,
-            goals TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-    
-def setup_otp_table():
-    conn = connect_for_setup(USER_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS email_otps (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT NOT NULL,
-            otp TEXT NOT NULL,
-            expires_at INTEGER NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-    
-    
     # ensure an admin exists if ADMIN_PASSWORD provided
     create_admin_if_missing()
 
+_journal_fts_enabled = None
+
+def journal_fts_enabled():
+    """Whether journal_fts exists (sqlite may be built without FTS5)."""
+    global _journal_fts_enabled
+    if _journal_fts_enabled is None:
+        conn = get_db(JOURNAL_DB)
+        _journal_fts_enabled = bool(conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_fts'"
+        ).fetchone())
+    return _journal_fts_enabled
+
 def create_admin_if_missing():
     """
     Create initial admin user from environment variables.
@@ -314,22 +225,26 @@ def create_admin_if_missing():
     if not ADMIN_PASSWORD:
         logger.info("ADMIN_PASSWORD not provided: skipping auto-create admin")
         return
-    # Use a direct connection to avoid app context caching issues during setup
-    conn = sqlite3.connect(USER_DB, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT id FROM users WHERE username = ?", (ADMIN_USER,))
-    if c.fetchone():
-        conn.close()
-        return
-    pw_hash = generate_password_hash(ADMIN_PASSWORD)
-    c.execute(
-        "INSERT INTO users (username, email, password_hash, email_verified, is_admin, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-        (ADMIN_USER, "", pw_hash, 1, 1, now())
-    )
-    conn.commit()
-    conn.close()
-    logger.info("Admin user created: %s", ADMIN_USER)
+    # Borrow straight from the pool: setup runs outside any app context
+    pool = get_pool(USER_DB)
+    conn = pool.acquire()
+    try:
+        c = conn.cursor()
+        c.execute("SELECT id FROM users WHERE username = ?", (ADMIN_USER,))
+        if c.fetchone():
+            return
+        pw_hash = generate_password_hash(ADMIN_PASSWORD)
+        # OR IGNORE: workers booting together may race to seed it
+        c.execute(
+            "INSERT OR IGNORE INTO users (username, email, password_hash, email_verified, is_admin, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (ADMIN_USER, "", pw_hash, 1, 1, now())
+        )
+        created = c.rowcount
+        conn.commit()
+    finally:
+        pool.release(conn)
+    if created:
+        logger.info("Admin user created: %s", ADMIN_USER)
 
 setup_databases()
 
@@ -337,14 +252,12 @@ setup_databases()
 # Session / conversation helpers
 # ======================================================
 def create_empty_conversation():
-    conn = connect_for_setup(CONV_DB)
-    c = conn.cursor()
-
     user_id = session.get("user_id")
     if not user_id:
-        conn.close()
         return None
 
+    conn = get_db(CONV_DB)
+    c = conn.cursor()
     c.execute(
         "INSERT INTO conversations (user_id, title, history, created_at) VALUES (?, ?, ?, ?)",
         (user_id, "__current__", json.dumps([]), now())
@@ -352,10 +265,17 @@ def create_empty_conversation():
 
     conv_id = c.lastrowid
     conn.commit()
-    conn.close()
     return conv_id
 
-def get_history_by_conv_id(conv_id):
+# How many trailing messages /chat loads as context; the prompt takes as
+# many of them as fit PROMPT_TOKEN_BUDGET (context_packer.py).
+CHAT_CONTEXT_MESSAGES = 30
+
+def get_history_by_conv_id(conv_id, limit=None):
+    """
+    Return the conversation's messages in order. With `limit`, only the
+    last `limit` messages are read (indexed by (conv_id, seq)).
+    """
     if not conv_id:
         return []
     conn = get_db(CONV_DB)
@@ -363,24 +283,99 @@ def get_history_by_conv_id(conv_id):
         return []
     c = conn.cursor()
     c.execute(
-    "SELECT history FROM conversations WHERE id = ? AND user_id = ?",
-    (conv_id, session.get("user_id"))
-)
+        "SELECT history FROM conversations WHERE id = ? AND user_id = ?",
+        (conv_id, session.get("user_id"))
+    )
     row = c.fetchone()
-    return json.loads(row["history"]) if row and row["history"] else []
+    if not row:
+        return []
 
-def save_history_by_conv_id(conv_id, history):
-    if not conv_id:
-        return
+    # Legacy conversation not yet migrated: explode it on first touch
+    if row["history"] and row["history"] != "[]":
+        explode_history_blob(conn, conv_id, row["history"])
+        conn.commit()
+
+    if limit:
+        c.execute(
+            "SELECT role, content, ts FROM messages WHERE conv_id = ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (conv_id, limit)
+        )
+        rows = c.fetchall()[::-1]
+    else:
+        c.execute(
+            "SELECT role, content, ts FROM messages WHERE conv_id = ? ORDER BY seq",
+            (conv_id,)
+        )
+        rows = c.fetchall()
+    return [{"role": r["role"], "content": r["content"], "ts": r["ts"]} for r in rows]
+
+def append_messages(conv_id, new_messages):
+    """
+    Append chat turns to a conversation: one INSERT per message, nothing
+    already stored is rewritten. Returns the conversation's new version
+    (bumped once per append), or None if the conversation is gone.
+
+    Concurrent appends to one conversation (two tabs, a retry, another
+    worker) are serialized by SQLite's write lock: BEGIN IMMEDIATE takes
+    it before MAX(seq) is read, so each call's turns land together after
+    whatever committed first and none are lost. The lock is held for
+    these few statements only, never across an LLM call.
+    """
+    if not conv_id or not new_messages:
+        return None
     conn = get_db(CONV_DB)
     if not conn:
-        return
+        return None
+    if conn.in_transaction:
+        conn.commit()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute(
+            "UPDATE conversations SET created_at = ?, version = version + 1 "
+            "WHERE id = ? AND user_id = ?",
+            (now(), conv_id, session.get("user_id"))
+        )
+        if not c.rowcount:
+            conn.rollback()
+            return None
+        c.execute("SELECT COALESCE(MAX(seq), -1) FROM messages WHERE conv_id = ?", (conv_id,))
+        next_seq = c.fetchone()[0] + 1
+        c.executemany(
+            "INSERT INTO messages (conv_id, seq, role, content, ts) VALUES (?, ?, ?, ?, ?)",
+            [
+                (conv_id, next_seq + i, m["role"], m["content"], m.get("ts"))
+                for i, m in enumerate(new_messages)
+            ]
+        )
+        c.execute("SELECT version FROM conversations WHERE id = ?", (conv_id,))
+        version = c.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
+
+# Tables keyed by conv_id. Deleted explicitly with their conversation:
+# split-file mode has no ON DELETE CASCADE, and the queue/idempotency
+# tables carry no foreign key in either mode.
+CONV_CHILD_TABLES = ("memories", "messages", "summary_jobs", "chat_requests", "conversation_summaries")
+
+def delete_conversation_rows(conn, conv_id, user_id):
+    """Delete a user's conversation plus its dependent rows."""
     c = conn.cursor()
+    for table in CONV_CHILD_TABLES:
+        c.execute(
+            f"DELETE FROM {table} WHERE conv_id IN "
+            "(SELECT id FROM conversations WHERE id = ? AND user_id = ?)",
+            (conv_id, user_id)
+        )
     c.execute(
-    "UPDATE conversations SET history = ?, created_at = ? WHERE id = ? AND user_id = ?",
-    (json.dumps(history), now(), conv_id, session.get("user_id"))
-)
-    conn.commit()
+        "DELETE FROM conversations WHERE id = ? AND user_id = ?",
+        (conv_id, user_id)
+    )
+    return c.rowcount
 
 def delete_conversation(conv_id):
     if not conv_id or not session.get("user_id"):
@@ -388,11 +383,7 @@ def delete_conversation(conv_id):
     conn = get_db(CONV_DB)
     if not conn:
         return
-    c = conn.cursor()
-    c.execute(
-        "DELETE FROM conversations WHERE id = ? AND user_id = ?",
-        (conv_id, session.get("user_id"))
-    )
+    delete_conversation_rows(conn, conv_id, session.get("user_id"))
     conn.commit()
 
 # ======================================================
@@ -418,18 +409,12 @@ def get_memory(conv_id):
 def upsert_memory(conv_id, summary_text):
     if not summary_text:
         return
-    try:
-        conn = get_db(CONV_DB)
-        if not conn:
-            return
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO memories (conv_id, summary, updated_at) VALUES (?, ?, ?)",
-            (conv_id, summary_text, now())
-        )
-        conn.commit()
-    except Exception:
-        logger.exception("Failed to upsert memory")
+    # Nobody waits on this row; it is group-committed by the write queue.
+    # store_memory() folds near-duplicates and keeps the conversation capped;
+    # remember() makes it the conversation's entry in the user-level memory.
+    ts = now()
+    defer_write(CONV_DB, store_memory, (conv_id, summary_text, ts))
+    defer_write(CONV_DB, remember, (conv_id, summary_text, ts))
 
 def list_memories(conv_id):
     try:
@@ -439,8 +424,8 @@ def list_memories(conv_id):
         c = conn.cursor()
         c.execute(
             "SELECT id, summary FROM memories WHERE conv_id = ? "
-            "ORDER BY updated_at DESC",
-            (conv_id,)
+            "ORDER BY updated_at DESC LIMIT ?",
+            (conv_id, MEMORY_MAX_PER_CONV)
         )
         return [r["summary"] for r in c.fetchall()]
     except Exception:
@@ -466,14 +451,12 @@ def login_user(user_row):
     session["is_admin"] = bool(user_row["is_admin"])
     session.permanent = True
 
-    # 🔹 Update last_login timestamp
-    conn = get_db(USER_DB)
-    if conn:
-        conn.execute(
-            "UPDATE users SET last_login = ? WHERE id = ?",
-            (now(), user_row["id"])
-        )
-        conn.commit()
+    # 🔹 Update last_login timestamp (deferred, off the login latency path)
+    defer_write(
+        USER_DB,
+        "UPDATE users SET last_login = ? WHERE id = ?",
+        (now(), user_row["id"])
+    )
 
 def logout_user():
     for k in ("user_id", "username", "is_admin"):
@@ -628,6 +611,9 @@ _CRISIS_PATTERNS = [
 ]
 _CRISIS_RE = [(re.compile(pat, re.IGNORECASE), score) for pat, score in _CRISIS_PATTERNS]
 
+# Score at which a message is treated as a crisis (canned safety reply)
+CRISIS_SCORE_THRESHOLD = 4
+
 def compute_crisis_score(text: str) -> int:
     t = (text or "").strip()
     score = 0
@@ -780,52 +766,25 @@ def handle_breathless_inline(user_text: str):
     )
 
 # ======================================================
-# Simple TF-based "embedding" prototype + similarity
+# Memory retrieval (term vectors + inverted index, see memory_store.py)
 # ======================================================
-_WORD_RE = re.compile(r"\b[a-zA-Z']{2,}\b")
-
-def tokenize(text):
-    text = (text or "").lower()
-    return _WORD_RE.findall(text)
-
-def build_tf_vector(text):
-    tokens = tokenize(text)
-    vec = {}
-    for t in tokens:
-        vec[t] = vec.get(t, 0) + 1
-    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
-    for k in list(vec.keys()):
-        vec[k] = vec[k] / norm
-    return vec
-
-def cosine_sim(vec_a, vec_b):
-    if not vec_a or not vec_b:
-        return 0.0
-    if len(vec_a) > len(vec_b):
-        vec_a, vec_b = vec_b, vec_a
-    s = 0.0
-    for k, v in vec_a.items():
-        if k in vec_b:
-            s += v * vec_b[k]
-    return s
-
 def retrieve_relevant_memories(conv_id, query, top_k=3):
     try:
-        memories = list_memories(conv_id)
-        if not memories:
-            return []
-        q_vec = build_tf_vector(query)
-        scored = []
-        for m in memories:
-            m_vec = build_tf_vector(m)
-            score = cosine_sim(q_vec, m_vec)
-            scored.append((score, m))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [m for s, m in scored[:top_k] if s > 0.0]
+        return search_memories(get_db(CONV_DB), conv_id, query, top_k=top_k)
     except Exception:
         logger.exception("Memory retrieval failed")
         return []
 
+def retrieve_user_memories(user_id, query, exclude_conv_id=None, top_k=2):
+    """Summaries from the user's other conversations (see user_memory.py)."""
+    try:
+        return search_user_memories(
+            get_db(CONV_DB), user_id, query, top_k=top_k, exclude_conv_id=exclude_conv_id
+        )
+    except Exception:
+        logger.exception("User memory retrieval failed")
+        return []
+
 # ======================================================
 # Simple language hint (English vs Hindi) for prompt
 # ======================================================
@@ -843,6 +802,87 @@ def detect_language_hint_for_prompt(text: str) -> str:
             return "hi"
     return "en"
 
+# ======================================================
+# System prompt (prebuilt once per language variant)
+# ======================================================
+LANG_INSTRUCTIONS = {
+    "hi": (
+        "Respond in natural, conversational Hindi. "
+        "If the user mixes Hindi and English, respond in natural Hinglish."
+    ),
+    "en": (
+        "Respond in natural, conversational English. "
+        "If the user mixes languages, mirror their style naturally."
+    ),
+}
+
+def build_system_prompt(lang_instruction):
+    # Persona & style: friend + therapist vibe, continuity-aware, multilingual
+    return {
+        "role": "system",
+        "content": (
+            "You are **Theramind**, a world-class mental wellness companion designed for global users. "
+            "You are calm, emotionally intelligent, deeply attentive, and grounded. You speak like a thoughtful human — "
+            "never robotic, scripted, preachy, or repetitive.\n\n"
+
+            "=== CORE IDENTITY ===\n"
+            "- You are NOT a doctor, but you are highly informed about mental health, wellbeing, stress, anxiety, and emotional regulation.\n"
+            "- You may provide **safe, general medical and mental health guidance**, lifestyle suggestions, and evidence-based practices, "
+            "but you must NEVER diagnose conditions, prescribe medications, or claim clinical authority.\n"
+            "- When something may require professional or emergency help, you gently and clearly encourage seeking it.\n\n"
+
+            "=== LANGUAGE & CULTURE ===\n"
+            f"- {lang_instruction}\n"
+            "- Match the user's language naturally (English, Hindi, or mixed Hinglish if the user mixes).\n"
+            "- Use culturally neutral, globally understandable language.\n\n"
+
+            "=== CONVERSATION INTELLIGENCE (VERY IMPORTANT) ===\n"
+            "- Maintain **strong continuity** across the conversation.\n"
+            "- Remember what the user has already shared and build on it.\n"
+            "- NEVER repeat the same opening lines, advice, or questions unnecessarily.\n"
+            "- Do NOT ask generic questions like 'Can you tell me more?' repeatedly.\n"
+            "- If the user has already tried something (e.g., breathing, grounding), acknowledge it and adapt — do NOT restart it blindly.\n\n"
+
+            "=== RESPONSE STYLE ===\n"
+            "- Validate emotions clearly and specifically.\n"
+            "- Be concise but meaningful (typically 2–6 sentences).\n"
+            "- Prefer thoughtful reflections and gentle insights over long explanations.\n"
+            "- Ask open-ended questions only when they truly move the conversation forward.\n"
+            "- Avoid clichés, therapy-speak, or motivational fluff.\n\n"
+
+            "=== MEDICAL & WELLNESS GUIDANCE ===\n"
+            "- You MAY suggest:\n"
+            "  • grounding techniques\n"
+            "  • breathing practices\n"
+            "  • sleep hygiene tips\n"
+            "  • nutrition & hydration awareness\n"
+            "  • exercise, sunlight, routines\n"
+            "  • when to consider talking to a professional\n"
+            "- You MUST phrase medical-related advice as:\n"
+            "  'Many people find...', 'In general, it can help to...', 'You might consider...'\n"
+            "- NEVER say or imply you are a medical professional.\n\n"
+
+            "=== SAFETY ===\n"
+            "- If the user expresses self-harm, suicidal thoughts, or medical emergencies, prioritize safety and crisis guidance immediately.\n"
+            "- Be calm, direct, and supportive — never alarmist or dismissive.\n\n"
+
+            "=== OVERALL GOAL ===\n"
+            "Your goal is to help the user feel:\n"
+            "- understood\n"
+            "- emotionally safer\n"
+            "- mentally clearer\n"
+            "- supported without dependence\n\n"
+
+            "Respond as a thoughtful human companion who genuinely remembers and cares."
+            "- If your response would repeat phrasing from your last 2 messages, rephrase it completely."
+
+        ),
+    }
+
+# Byte-identical across requests, so OpenRouter/OpenAI can serve the prefix
+# from the provider's prompt cache
+SYSTEM_PROMPTS = {code: build_system_prompt(text) for code, text in LANG_INSTRUCTIONS.items()}
+
 # ======================================================
 # Redirect intent detection & summarization helpers
 # ======================================================
@@ -874,7 +914,12 @@ def detect_redirect_intent(user_text):
         return {"type": "redirect", "url": "/journaling", "label": "journal"}
     return None
 
-def summarize_history_for_memory(chat_history):
+def summarize_history_for_memory(chat_history, previous_summary=None):
+    """
+    Two-sentence memory summary. With `previous_summary`, `chat_history`
+    only holds the turns since it was written and the summary is updated
+    rather than rebuilt from the whole conversation.
+    """
     try:
         snippet = "\n".join(
             [
@@ -882,14 +927,25 @@ def summarize_history_for_memory(chat_history):
                 for m in chat_history[-30:]
             ]
         )
-        system = {
-            "role": "system",
-            "content": (
-                "Summarize the user's key facts, patterns, and concerns from this conversation "
-                "in 2 short factual sentences for memory storage. "
-                "Focus on stable themes rather than moment-to-moment details."
-            ),
-        }
+        if previous_summary:
+            system = {
+                "role": "system",
+                "content": (
+                    "Update this memory summary of the conversation with the new messages below. "
+                    "Return 2 short factual sentences covering the user's key facts, patterns, "
+                    "and concerns. Focus on stable themes rather than moment-to-moment details.\n\n"
+                    f"Current summary: {previous_summary}"
+                ),
+            }
+        else:
+            system = {
+                "role": "system",
+                "content": (
+                    "Summarize the user's key facts, patterns, and concerns from this conversation "
+                    "in 2 short factual sentences for memory storage. "
+                    "Focus on stable themes rather than moment-to-moment details."
+                ),
+            }
         messages = [system, {"role": "user", "content": safe_trim(snippet, 4000)}]
         summary = call_openrouter_with_retries(messages, retries=1, timeout=8)
         return safe_trim(summary, max_len=800)
@@ -900,23 +956,11 @@ def summarize_history_for_memory(chat_history):
 # ======================================================
 # OpenRouter integration (safer)
 # ======================================================
-def prepare_messages(chat_history, limit=16, per_msg_max=1200):
-    """
-    Convert internal history format to OpenAI-style messages.
-    We keep a reasonable window (default 16 turns) for continuity.
-    """
-    msgs = [m for m in chat_history if m.get("role") in ("user", "model")]
-    msgs = msgs[-limit:]
-    out = []
-    for m in msgs:
-        role = "assistant" if m["role"] == "model" else m["role"]
-        out.append({"role": role, "content": safe_trim(m["content"], max_len=per_msg_max)})
-    return out
-
-def call_openrouter_with_retries(messages, retries=2, timeout=10):
+def openrouter_request(messages):
+    """(path, headers, payload) for a chat completion call (see llm_client.py)."""
     if not OPENROUTER_API_KEY:
         raise RuntimeError("OPENROUTER_API_KEY not configured")
-    url = "https://openrouter.ai/api/v1/chat/completions"
+    path = "/chat/completions"
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
@@ -932,14 +976,60 @@ def call_openrouter_with_retries(messages, retries=2, timeout=10):
 
     # 🔁 Reduce repetition & looping
     "presence_penalty": 0.3,    # encourages new ideas gently
+
+    # 📊 Token usage (incl. prompt cache hits) in the response / last stream chunk
+    "usage": {"include": True},
     }
+    return path, headers, payload
+
+def is_upstream_failure(exc):
+    """Errors that say OpenRouter is unhealthy (vs. a bad request of ours)."""
+    if isinstance(exc, (AdmissionRejected, CircuitOpenError, DeadlineExceeded)):
+        # raised on our side without OpenRouter being asked
+        return False
+    if isinstance(exc, HTTPError) and exc.response is not None:
+        code = exc.response.status_code
+        return code >= 500 or code == 429
+    return True
+
+def call_openrouter_with_retries(messages, retries=2, timeout=10, user_id=None, priority=False,
+                                 deadline=None):
+    """
+    Non-streaming completion. Goes through the worker's circuit breaker
+    (circuit_breaker.py): while it is open this raises CircuitOpenError at
+    once, and each attempt's read timeout adapts to observed p95 latency.
+    The call (all attempts) holds one admission slot (admission.py).
+    With a `deadline` (deadline.py) queueing, attempts and retries only use
+    what is left of the request's budget.
+    """
+    path, headers, payload = openrouter_request(messages)
+    with llm_slot(user_id, priority, timeout=queue_timeout(deadline)):
+        return _call_openrouter(path, headers, payload, retries, timeout, deadline)
+
+def queue_timeout(deadline):
+    """How long a call may wait for an admission slot and still fit its deadline."""
+    if deadline is None:
+        return LLM_QUEUE_TIMEOUT
+    return max(0.0, min(LLM_QUEUE_TIMEOUT, deadline.remaining() - MIN_ATTEMPT_SECONDS))
 
+def _call_openrouter(path, headers, payload, retries, timeout, deadline=None):
     last_exc = None
     for attempt in range(retries + 1):
+        if not circuit_allow():
+            raise CircuitOpenError("OpenRouter circuit open") from last_exc
+        if deadline is not None and not deadline.allows(MIN_ATTEMPT_SECONDS):
+            logger.warning("Skipping OpenRouter attempt %s: %.1fs left", attempt + 1, deadline.remaining())
+            raise DeadlineExceeded("no time left for an OpenRouter attempt") from last_exc
+        read_timeout = adaptive_timeout(timeout)
+        if deadline is not None:
+            read_timeout = deadline.cap(read_timeout)
+        started = time.monotonic()
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
+            resp = llm_post(path, read_timeout=read_timeout, headers=headers, json=payload)
             resp.raise_for_status()
             result = resp.json()
+            circuit_success(time.monotonic() - started)
+            record_usage(result.get("usage"))
             if "choices" in result and result["choices"]:
                 text = result["choices"][0]["message"]["content"]
                 return remove_ai_language(text) or graceful_gibberish_reply()
@@ -947,10 +1037,72 @@ def call_openrouter_with_retries(messages, retries=2, timeout=10):
             break
         except Exception as e:
             last_exc = e
+            # a bad request of ours says nothing about OpenRouter's health:
+            # it neither resets the failure count nor enters the p95
+            if is_upstream_failure(e):
+                circuit_failure()
             logger.exception("OpenRouter call failed (attempt %s): %s", attempt + 1, e)
-            time.sleep(0.5 * (attempt + 1))
+            if attempt < retries:
+                backoff = 0.5 * (attempt + 1)
+                if deadline is not None and not deadline.allows(backoff + MIN_ATTEMPT_SECONDS):
+                    break
+                time.sleep(backoff)
     raise last_exc or RuntimeError("OpenRouter unknown error")
 
+def stream_openrouter(messages, timeout=12, user_id=None, priority=False, deadline=None):
+    """
+    Yield reply text as it arrives (OpenRouter `stream: true`, SSE).
+    No retries: once tokens have been relayed a retry would duplicate them.
+    Raises CircuitOpenError without calling out while the breaker is open,
+    and AdmissionRejected when no call slot frees up in time. With a
+    `deadline`, the stream is cut off when the request's budget runs out.
+    """
+    if not circuit_allow():
+        raise CircuitOpenError("OpenRouter circuit open")
+    if deadline is not None and not deadline.allows(MIN_ATTEMPT_SECONDS):
+        raise DeadlineExceeded("no time left for an OpenRouter stream")
+    path, headers, payload = openrouter_request(messages)
+    payload["stream"] = True
+    with llm_slot(user_id, priority, timeout=queue_timeout(deadline)):
+        # Timeout and latency start once a slot is granted: the queue wait
+        # comes out of the deadline and is not upstream latency
+        read_timeout = adaptive_timeout(timeout)
+        if deadline is not None:
+            if not deadline.allows(MIN_ATTEMPT_SECONDS):
+                raise DeadlineExceeded("no time left for an OpenRouter stream")
+            read_timeout = deadline.cap(read_timeout)
+        started = time.monotonic()
+        try:
+            with llm_post(path, read_timeout=read_timeout, headers=headers, json=payload, stream=True) as resp:
+                resp.raise_for_status()
+                resp.encoding = "utf-8"
+                for line in resp.iter_lines(decode_unicode=True):
+                    # blank separators and ": OPENROUTER PROCESSING" keep-alive comments
+                    if deadline is not None and not deadline.remaining():
+                        logger.warning("OpenRouter stream cut off at the request deadline")
+                        break
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    if chunk.get("usage"):
+                        record_usage(chunk["usage"])
+                    choices = chunk.get("choices") or []
+                    if choices:
+                        delta = (choices[0].get("delta") or {}).get("content")
+                        if delta:
+                            yield delta
+        except Exception as e:
+            if is_upstream_failure(e):
+                circuit_failure()
+            raise
+        circuit_success(time.monotonic() - started)
+
 def remove_ai_language(reply):
     blacklist = [
         "as an AI",
@@ -971,11 +1123,45 @@ def remove_ai_language(reply):
 # ======================================================
 # Core: generate_reply_with_context -> (reply_text, action)
 # ======================================================
-def generate_reply_with_context(chat_history, conv_id=None, allow_remote_processing=False):
+def generate_reply_with_context(chat_history, conv_id=None, allow_remote_processing=False, user_id=None,
+                                deadline=None):
     """
     FINAL production-grade chat brain for Theramind.
     AI-first, continuity-aware, emotionally intelligent, safety-aligned.
     """
+    reply_text, action, messages = prepare_reply(
+        chat_history, conv_id, allow_remote_processing, user_id, deadline
+    )
+    if messages is None:
+        return reply_text, action
+
+    # -------------------------------------------------
+    # AI GENERATION
+    # -------------------------------------------------
+    release_dbs()
+    try:
+        reply_text = call_openrouter_with_retries(
+            messages, retries=2, timeout=12,
+            user_id=user_id, priority=is_priority_message(chat_history),
+            deadline=deadline,
+        )
+    except (CircuitOpenError, AdmissionRejected, DeadlineExceeded) as e:
+        logger.info("%s, serving fallback reply", e)
+        reply_text = fallback_reply()
+    except Exception:
+        reply_text = fallback_reply()
+
+    return finish_reply(chat_history, conv_id, allow_remote_processing, reply_text), None
+
+def prepare_reply(chat_history, conv_id=None, allow_remote_processing=False, user_id=None,
+                  deadline=None):
+    """
+    Everything before the LLM call. Returns (reply_text, action, None) when
+    a safety/intent short-circuit answers directly, else (None, None,
+    messages) for the model. Shared by /chat and its streaming mode.
+    Memory retrieval is optional: it is skipped when `deadline` has too
+    little time left for the model call that follows.
+    """
 
     # -------------------------------------------------
     # Extract last user message
@@ -991,13 +1177,13 @@ def generate_reply_with_context(chat_history, conv_id=None, allow_remote_process
     # -------------------------------------------------
     allowed, _ = moderate_text(last_user_message)
     if not allowed:
-        return "I’m sorry — I can’t help with that request.", None
+        return "I’m sorry — I can’t help with that request.", None, None
 
     # -------------------------------------------------
     # Crisis detection (HIGH PRIORITY)
     # -------------------------------------------------
     crisis_score = compute_crisis_score(last_user_message)
-    if crisis_score >= 4:
+    if crisis_score >= CRISIS_SCORE_THRESHOLD:
         resources = get_crisis_resources()
         lines = [
             "I’m really glad you told me this. What you’re describing sounds overwhelming, and your safety matters deeply.",
@@ -1015,19 +1201,19 @@ def generate_reply_with_context(chat_history, conv_id=None, allow_remote_process
             "type": "crisis",
             "resources": resources,
             "score": crisis_score,
-        }
+        }, None
 
     # -------------------------------------------------
     # Panic / breathlessness handling
     # -------------------------------------------------
     if matches_breathless(last_user_message):
-        return handle_breathless_inline(last_user_message)
+        return (*handle_breathless_inline(last_user_message), None)
 
     # -------------------------------------------------
     # Gibberish / accidental input
     # -------------------------------------------------
     if looks_like_gibberish(last_user_message):
-        return graceful_gibberish_reply(), None
+        return graceful_gibberish_reply(), None, None
 
     # -------------------------------------------------
     # Detect explicit redirect intent (journal / breathing)
@@ -1036,7 +1222,8 @@ def generate_reply_with_context(chat_history, conv_id=None, allow_remote_process
     if redirect_intent:
         return (
             f"Alright — taking you to the {redirect_intent['label']} now.",
-            redirect_intent
+            redirect_intent,
+            None,
     )
 
 
@@ -1051,82 +1238,18 @@ def generate_reply_with_context(chat_history, conv_id=None, allow_remote_process
     )
     lang_code = detect_language_hint_for_prompt(recent_user_text)
 
-    if lang_code == "hi":
-        lang_instruction = (
-            "Respond in natural, conversational Hindi. "
-            "If the user mixes Hindi and English, respond in natural Hinglish."
-        )
-    else:
-        lang_instruction = (
-            "Respond in natural, conversational English. "
-            "If the user mixes languages, mirror their style naturally."
-        )
-
+    # Static persona first so every request for a language shares the same
+    # prompt prefix (provider prompt caching); per-turn context follows it
+    messages.append(SYSTEM_PROMPTS.get(lang_code, SYSTEM_PROMPTS["en"]))
 
-    # Persona & style: friend + therapist vibe, continuity-aware, multilingual
-    system_prompt = {
-    "role": "system",
-    "content": (
-        "You are **Theramind**, a world-class mental wellness companion designed for global users. "
-        "You are calm, emotionally intelligent, deeply attentive, and grounded. You speak like a thoughtful human — "
-        "never robotic, scripted, preachy, or repetitive.\n\n"
-
-        "=== CORE IDENTITY ===\n"
-        "- You are NOT a doctor, but you are highly informed about mental health, wellbeing, stress, anxiety, and emotional regulation.\n"
-        "- You may provide **safe, general medical and mental health guidance**, lifestyle suggestions, and evidence-based practices, "
-        "but you must NEVER diagnose conditions, prescribe medications, or claim clinical authority.\n"
-        "- When something may require professional or emergency help, you gently and clearly encourage seeking it.\n\n"
-
-        "=== LANGUAGE & CULTURE ===\n"
-        f"- {lang_instruction}\n"
-        "- Match the user's language naturally (English, Hindi, or mixed Hinglish if the user mixes).\n"
-        "- Use culturally neutral, globally understandable language.\n\n"
-
-        "=== CONVERSATION INTELLIGENCE (VERY IMPORTANT) ===\n"
-        "- Maintain **strong continuity** across the conversation.\n"
-        "- Remember what the user has already shared and build on it.\n"
-        "- NEVER repeat the same opening lines, advice, or questions unnecessarily.\n"
-        "- Do NOT ask generic questions like 'Can you tell me more?' repeatedly.\n"
-        "- If the user has already tried something (e.g., breathing, grounding), acknowledge it and adapt — do NOT restart it blindly.\n\n"
-
-        "=== RESPONSE STYLE ===\n"
-        "- Validate emotions clearly and specifically.\n"
-        "- Be concise but meaningful (typically 2–6 sentences).\n"
-        "- Prefer thoughtful reflections and gentle insights over long explanations.\n"
-        "- Ask open-ended questions only when they truly move the conversation forward.\n"
-        "- Avoid clichés, therapy-speak, or motivational fluff.\n\n"
-
-        "=== MEDICAL & WELLNESS GUIDANCE ===\n"
-        "- You MAY suggest:\n"
-        "  • grounding techniques\n"
-        "  • breathing practices\n"
-        "  • sleep hygiene tips\n"
-        "  • nutrition & hydration awareness\n"
-        "  • exercise, sunlight, routines\n"
-        "  • when to consider talking to a professional\n"
-        "- You MUST phrase medical-related advice as:\n"
-        "  'Many people find...', 'In general, it can help to...', 'You might consider...'\n"
-        "- NEVER say or imply you are a medical professional.\n\n"
-
-        "=== SAFETY ===\n"
-        "- If the user expresses self-harm, suicidal thoughts, or medical emergencies, prioritize safety and crisis guidance immediately.\n"
-        "- Be calm, direct, and supportive — never alarmist or dismissive.\n\n"
-
-        "=== OVERALL GOAL ===\n"
-        "Your goal is to help the user feel:\n"
-        "- understood\n"
-        "- emotionally safer\n"
-        "- mentally clearer\n"
-        "- supported without dependence\n\n"
-
-        "Respond as a thoughtful human companion who genuinely remembers and cares."
-        "- If your response would repeat phrasing from your last 2 messages, rephrase it completely."
-
-    ),
-}
     # Retrieve high-level memories (previous summaries)
-    if conv_id and allow_remote_processing:
-     memories = retrieve_relevant_memories(conv_id, last_user_message, top_k=3)
+    with_memories = deadline is None or deadline.allows(MIN_ATTEMPT_SECONDS)
+    if not with_memories:
+        logger.warning("Skipping memory retrieval: %.1fs left", deadline.remaining())
+    memories = []
+    if conv_id and allow_remote_processing and with_memories:
+        with stage(deadline, "memory", 0.5):
+            memories = retrieve_relevant_memories(conv_id, last_user_message, top_k=3)
     if memories:
         messages.append(
             {
@@ -1138,13 +1261,30 @@ def generate_reply_with_context(chat_history, conv_id=None, allow_remote_process
                 ),
             }
         )
-    messages.append(system_prompt)
+
+    # Carry-over from the user's earlier conversations
+    earlier = []
+    if user_id and allow_remote_processing and with_memories:
+        with stage(deadline, "user_memory", 0.5):
+            earlier = retrieve_user_memories(user_id, last_user_message, exclude_conv_id=conv_id)
+    if earlier:
+        messages.append(
+            {
+                "role": "system",
+                "content": (
+                    "From earlier conversations with this user:\n"
+                    + " | ".join([safe_trim(m, 300) for m in earlier])
+                    + "\nBring this up only if it is relevant. Do NOT repeat it verbatim."
+                ),
+            }
+        )
 
     # -------------------------------------------------
     # Conversation history
     # -------------------------------------------------
     if allow_remote_processing:
-        messages.extend(prepare_messages(chat_history, limit=18, per_msg_max=1200))
+        # As many recent turns as fit the prompt token budget (context_packer.py)
+        messages, _ = pack_messages(messages, chat_history)
     else:
         recap = []
         for m in chat_history[-6:]:
@@ -1162,40 +1302,104 @@ def generate_reply_with_context(chat_history, conv_id=None, allow_remote_process
             }
         )
 
-    # -------------------------------------------------
-    # AI GENERATION
-    # -------------------------------------------------
-    try:
-        reply_text = call_openrouter_with_retries(
-            messages, retries=2, timeout=12
-        )
-    except Exception:
-        reply_text = random.choice(
-            [
-                "I’m here with you. We can take this one step at a time.",
-                "Thanks for trusting me with this. What feels most important right now?",
-                "I’m still with you. We don’t have to rush this.",
-            ]
-        )
+    return None, None, messages
 
-    reply_text = remove_ai_language(reply_text).strip()
+def is_priority_message(chat_history, recent=3):
+    """
+    Conversations in crisis or panic skip the LLM admission queue
+    (admission.py): true when the current user turn or one of the `recent`
+    before it crossed CRISIS_SCORE_THRESHOLD or reads as breathlessness.
+    Those turns themselves get canned replies, so it is the follow-ups in
+    such a conversation that reach the LLM with priority.
+    """
+    user_msgs = [m["content"] for m in chat_history if m.get("role") == "user"]
+    return any(
+        matches_breathless(text) or compute_crisis_score(text) >= CRISIS_SCORE_THRESHOLD
+        for text in user_msgs[-(recent + 1):]
+    )
+
+def fallback_reply():
+    return random.choice(
+        [
+            "I’m here with you. We can take this one step at a time.",
+            "Thanks for trusting me with this. What feels most important right now?",
+            "I’m still with you. We don’t have to rush this.",
+        ]
+    )
 
+def finish_reply(chat_history, conv_id, allow_remote_processing, reply_text):
+    """
+    Clean up the model's reply; returns the final text. Memory is updated
+    by the caller once the turn is saved (update_memory).
+    """
+    return remove_ai_language(reply_text).strip()
+
+def update_memory(chat_history, conv_id, allow_remote_processing):
     # -------------------------------------------------
     # Memory update (summarize only when meaningful)
     # -------------------------------------------------
+    # Called after append_messages() has committed the turn, so the job
+    # never summarizes a history that is missing the latest exchange.
+    # The summary is a second LLM round trip, so it is queued for the
+    # background worker (summary_queue.py) instead of delaying the reply.
+    # Enqueues coalesce per conversation; the job itself decides whether
+    # enough new turns arrived to be worth a call.
     try:
         if (
             conv_id
             and allow_remote_processing
-            and should_update_memory(chat_history, threshold_msgs=6)
+            and should_update_memory(chat_history, threshold_msgs=SUMMARY_EVERY_TURNS)
         ):
-            summary = summarize_history_for_memory(chat_history)
-            if summary:
-                upsert_memory(conv_id, summary)
+            release_dbs()
+            summary_jobs.enqueue(conv_id)
     except Exception:
         logger.exception("Memory update failed")
 
-    return reply_text, None
+def run_summary_job(conv_id):
+    """
+    Background summarization for one conversation; raising means retry.
+    The rolling summary is only advanced once SUMMARY_EVERY_TURNS new user
+    turns have arrived since its watermark, from the previous summary plus
+    those turns. Returns False when there was nothing to do.
+    """
+    # No request/session here: read the turns directly (the /chat request
+    # that enqueued the job already migrated any legacy history blob)
+    with app.app_context():
+        conn = get_db(CONV_DB)
+        prev = conn.execute(
+            "SELECT summary, through_seq FROM conversation_summaries WHERE conv_id = ?",
+            (conv_id,)
+        ).fetchone()
+        previous_summary, through_seq = (prev["summary"], prev["through_seq"]) if prev else (None, -1)
+        rows = conn.execute(
+            "SELECT seq, role, content FROM messages WHERE conv_id = ? AND seq > ? "
+            "ORDER BY seq DESC LIMIT 30",
+            (conv_id, through_seq)
+        ).fetchall()[::-1]
+        if sum(1 for r in rows if r["role"] == "user") < SUMMARY_EVERY_TURNS:
+            return False
+        delta = [{"role": r["role"], "content": r["content"]} for r in rows]
+        summary = summarize_history_for_memory(delta, previous_summary)
+        if not summary:
+            raise RuntimeError("summarization returned nothing")
+        # Only ever move the watermark forward
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO conversation_summaries (conv_id, summary, through_seq, updated_at)
+                SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM conversations WHERE id = ?)
+                ON CONFLICT(conv_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    through_seq = excluded.through_seq,
+                    updated_at = excluded.updated_at
+                WHERE excluded.through_seq > conversation_summaries.through_seq
+                """,
+                (conv_id, summary, rows[-1]["seq"], now(), conv_id)
+            )
+        upsert_memory(conv_id, summary)
+
+summary_jobs = SummaryQueue(CONV_DB, run_summary_job)
+chat_requests = IdempotencyStore(CONV_DB)
 
 # ======================================================
 # Routes & session handling (original + admin additions)
@@ -1530,15 +1734,6 @@ def profile():
     conn_users = get_db(USER_DB)
     conn_users.row_factory = sqlite3.Row
 
-    conn_conv = get_db(CONV_DB)
-    conn_conv.row_factory = sqlite3.Row
-
-    conn_journal = get_db(JOURNAL_DB)
-    conn_journal.row_factory = sqlite3.Row
-
-    conn_mood = get_db(MOOD_DB)
-    conn_mood.row_factory = sqlite3.Row
-
     # ---------- PASSWORD UPDATE ----------
     if request.method == "POST" and "current_password" in request.form:
         current_pw = request.form.get("current_password", "")
@@ -1583,43 +1778,39 @@ def profile():
         flash("Your intentions have been saved 🌱", "success")
         return redirect(url_for("profile"))
 
-    # ---------- STATS ----------
-    conversations = conn_conv.execute(
-        "SELECT COUNT(*) c FROM conversations WHERE user_id = ? AND title != '__current__'",
-        (user["id"],)
-    ).fetchone()["c"]
-
-    journals = conn_journal.execute(
-        "SELECT COUNT(*) c FROM journal_entries WHERE user_id = ?",
-        (user["id"],)
-    ).fetchone()["c"]
-
-    moods = conn_mood.execute(
-        "SELECT COUNT(*) c FROM mood_logs WHERE user_id = ?",
-        (user["id"],)
-    ).fetchone()["c"]
-
-    last_mood = conn_mood.execute(
-        "SELECT mood, date FROM mood_logs WHERE user_id = ? ORDER BY id DESC LIMIT 1",
-        (user["id"],)
+    # ---------- STATS (one round trip across all stores) ----------
+    row = get_joined_db().execute(
+        """
+        SELECT
+            COALESCE((SELECT saved FROM stats_conversations WHERE user_id = :uid), 0) AS conversations,
+            COALESCE((SELECT total FROM stats_journals WHERE user_id = :uid), 0) AS journals,
+            COALESCE((SELECT total FROM stats_moods WHERE user_id = :uid), 0) AS moods,
+            (SELECT mood FROM mood_logs WHERE user_id = :uid
+             ORDER BY date IS NULL, id DESC LIMIT 1) AS last_mood,
+            (SELECT date FROM mood_logs WHERE user_id = :uid
+             ORDER BY date IS NULL, id DESC LIMIT 1) AS last_mood_date,
+            (SELECT goals FROM user_profile WHERE user_id = :uid) AS goals
+        """,
+        {"uid": user["id"]}
     ).fetchone()
 
-    goals_row = conn_users.execute(
-        "SELECT goals FROM user_profile WHERE user_id = ?",
-        (user["id"],)
-    ).fetchone()
+    # newest dated entry; an undated one only when no entry has a date
+    last_mood = (
+        {"mood": row["last_mood"], "date": row["last_mood_date"]}
+        if row["last_mood"] is not None or row["last_mood_date"] is not None else None
+    )
 
     return render_template(
         "auth/profile.html",
         user=user,
         display_name=display_name,
         stats={
-            "conversations": conversations,
-            "journals": journals,
-            "moods": moods
+            "conversations": row["conversations"],
+            "journals": row["journals"],
+            "moods": row["moods"]
         },
         last_mood=last_mood,
-        goals=goals_row["goals"] if goals_row else ""
+        goals=row["goals"] or ""
     )
     
 
@@ -1648,7 +1839,9 @@ def ensure_session_and_conv():
     # ---------------------------------
     # Throttle chat requests only
     # ---------------------------------
-    if request.endpoint == "chat" and request.method == "POST":
+    # (repeats of an idempotency key already claimed are answered from
+    # chat_requests instead; a new key is throttled like any message)
+    if request.endpoint == "chat" and request.method == "POST" and not is_chat_replay():
         now_time = time.time()
         last = session.get("last_request", 0)
 
@@ -1749,47 +1942,119 @@ def admin_dashboard():
     # Just render; front-end will fetch data via API endpoints
     return render_template("admin/dashboard.html")
 
+# ---------- Admin list pagination helpers ----------
+ADMIN_PAGE_DEFAULT = 50
+ADMIN_PAGE_MAX = 200
+
+def admin_page_args():
+    """(limit, cursor) from the query string; cursor is the last id seen."""
+    limit = request.args.get("limit", ADMIN_PAGE_DEFAULT, type=int)
+    limit = min(ADMIN_PAGE_MAX, max(1, limit))
+    cursor = request.args.get("cursor", type=int)
+    return limit, cursor
+
+def date_range_filters(column, lo_arg, hi_arg, where, params):
+    """Append inclusive date-range predicates; a bare YYYY-MM-DD upper bound covers that whole day."""
+    lo = (request.args.get(lo_arg) or "").strip()
+    hi = (request.args.get(hi_arg) or "").strip()
+    if lo:
+        where.append(f"{column} >= ?")
+        params.append(lo)
+    if hi:
+        where.append(f"{column} <= ?")
+        params.append(hi + " 23:59:59" if len(hi) == 10 else hi)
+
+def keyset_page(conn, select_sql, where, params, limit, cursor, id_column="id"):
+    """
+    Run `select_sql` newest-first with keyset pagination on `id_column`.
+    Returns (rows, next_cursor).
+    """
+    if cursor:
+        where = where + [f"{id_column} < ?"]
+        params = params + [cursor]
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {id_column} DESC LIMIT ?"
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
 @app.route("/admin/users")
 @admin_required
 def admin_list_users():
-    conn = get_db(USER_DB)
+    """
+    Users newest-first, one bounded page at a time.
+    Filters: q (username/email prefix), created_from, created_to,
+    auth_provider, verified (0/1). Pass next_cursor back as ?cursor=.
+    """
+    conn = get_joined_db()
     if not conn:
-        return jsonify([])
-
-    c = conn.cursor()
-    c.execute("""
+        return jsonify(items=[], next_cursor=None)
+
+    limit, cursor = admin_page_args()
+    where, params = [], []
+
+    q = (request.args.get("q") or "").strip()
+    if q:
+        # Range predicates (not LIKE) so the username/email indexes are used
+        where.append("((u.username >= ? AND u.username < ?) OR (u.email >= ? AND u.email < ?))")
+        params += [q, q + "\uffff", q.lower(), q.lower() + "\uffff"]
+    date_range_filters("u.created_at", "created_from", "created_to", where, params)
+    provider = (request.args.get("auth_provider") or "").strip().lower()
+    if provider:
+        where.append("u.auth_provider = ?")
+        params.append(provider)
+    verified = request.args.get("verified")
+    if verified in ("0", "1"):
+        where.append("u.email_verified = ?")
+        params.append(int(verified))
+
+    # Counts are single-row lookups into the activity counters.
+    rows, next_cursor = keyset_page(
+        conn,
+        """
         SELECT 
-            id,
-            username,
-            email,
-            email_verified,
-            is_admin,
-            created_at,
-            last_login,
-            display_name,
-            intent,
-            auth_provider
-        FROM users
-        ORDER BY created_at DESC
-    """)
-
-    rows = c.fetchall()
+            u.id,
+            u.username,
+            u.email,
+            u.email_verified,
+            u.is_admin,
+            u.created_at,
+            u.last_login,
+            u.display_name,
+            u.intent,
+            u.auth_provider,
+            COALESCE((SELECT saved FROM stats_conversations sc WHERE sc.user_id = u.id), 0) AS conversations,
+            COALESCE((SELECT total FROM stats_journals sj WHERE sj.user_id = u.id), 0) AS journals,
+            COALESCE((SELECT total FROM stats_moods sm WHERE sm.user_id = u.id), 0) AS moods
+        FROM users u
+        """,
+        where, params, limit, cursor, id_column="u.id",
+    )
 
-    return jsonify([
-        {
-            "id": r["id"],
-            "username": r["username"],
-            "email": r["email"],
-            "email_verified": bool(r["email_verified"]),
-            "is_admin": bool(r["is_admin"]),
-            "created_at": r["created_at"],
-            "last_login": r["last_login"],
-            "display_name": r["display_name"],
-            "intent": r["intent"],
-            "login_type": (r["auth_provider"] or "email").capitalize()
-        }
-        for r in rows
-    ])
+    return jsonify(
+        items=[
+            {
+                "id": r["id"],
+                "username": r["username"],
+                "email": r["email"],
+                "email_verified": bool(r["email_verified"]),
+                "is_admin": bool(r["is_admin"]),
+                "created_at": r["created_at"],
+                "last_login": r["last_login"],
+                "display_name": r["display_name"],
+                "intent": r["intent"],
+                "login_type": (r["auth_provider"] or "email").capitalize(),
+                "conversations": r["conversations"],
+                "journals": r["journals"],
+                "moods": r["moods"]
+            }
+            for r in rows
+        ],
+        next_cursor=next_cursor,
+        limit=limit,
+    )
 
 @app.route("/admin/create_user", methods=["POST"])
 @admin_required
@@ -1857,14 +2122,26 @@ def admin_delete_user(user_id):
     if cur_user and cur_user["id"] == user_id:
         return jsonify({"status": "failed", "message": "Cannot delete your own account"}), 400
 
-    conn = get_db(USER_DB)
+    conn = get_joined_db()
     if not conn:
         return jsonify({"status": "failed", "message": "User DB unavailable"}), 500
 
     c = conn.cursor()
 
     try:
-        # 🔹 Delete user (CASCADE will handle related data if FK enabled)
+        # 🔹 Delete user. Conversation children are always cleared here
+        # (see CONV_CHILD_TABLES); in single mode CASCADE handles the rest,
+        # in split mode foreign keys cannot cross files, so clear it too.
+        for table in CONV_CHILD_TABLES:
+            c.execute(
+                f"DELETE FROM {table} WHERE conv_id IN "
+                "(SELECT id FROM conversations WHERE user_id = ?)",
+                (user_id,)
+            )
+        if DB_MODE != "single":
+            for table in ("conversations", "journal_entries", "mood_logs"):
+                c.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        c.execute("DELETE FROM user_profile WHERE user_id = ?", (user_id,))
         c.execute("DELETE FROM users WHERE id = ?", (user_id,))
 
         # 🔹 Log admin action
@@ -1943,83 +2220,267 @@ def admin_stats():
         "moods": 0,
     }
 
-    # ---- Users ----
     try:
-        conn = get_db(USER_DB)
-        if conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) AS cnt FROM users")
-            out["users"] = c.fetchone()["cnt"]
-    except Exception:
-        logger.exception("Failed to count users")
-
-    # ---- Conversations ----
-    try:
-        conn = get_db(CONV_DB)
-        if conn:
-            c = conn.cursor()
-            c.execute(
-                "SELECT COUNT(*) AS cnt FROM conversations WHERE title != '__current__'"
-            )
-            out["conversations"] = c.fetchone()["cnt"]
+        row = get_joined_db().execute(
+            """
+            SELECT
+                COALESCE((SELECT total FROM stats_users WHERE user_id = :g), 0) AS users,
+                COALESCE((SELECT saved FROM stats_conversations WHERE user_id = :g), 0) AS conversations,
+                COALESCE((SELECT total FROM stats_journals WHERE user_id = :g), 0) AS journals,
+                COALESCE((SELECT total FROM stats_moods WHERE user_id = :g), 0) AS moods
+            """,
+            {"g": GLOBAL_ROW}
+        ).fetchone()
+        out.update({k: row[k] for k in out})
     except Exception:
-        logger.exception("Failed to count conversations")
+        logger.exception("Failed to count dashboard stats")
 
-    # ---- Journals ----
-    try:
-        conn = get_db(JOURNAL_DB)
-        if conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) AS cnt FROM journal_entries")
-            out["journals"] = c.fetchone()["cnt"]
-    except Exception:
-        logger.exception("Failed to count journals")
+    return jsonify(out)
 
-    # ---- Mood logs ----
-    try:
-        conn = get_db(MOOD_DB)
-        if conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) AS cnt FROM mood_logs")
-            out["moods"] = c.fetchone()["cnt"]
-    except Exception:
-        logger.exception("Failed to count mood logs")
 
-    return jsonify(out)
+@app.route("/admin/db_stats")
+@admin_required
+def admin_db_stats():
+    """
+    Per-worker connection pool counters (hits, misses, waits, wait time),
+    write-behind queue depth, user memory cache size, OpenRouter
+    connection reuse, summarization queue counters, prompt token
+    estimates, the OpenRouter circuit breaker, LLM admission control and
+    /chat idempotency keys. ?flush=1 applies pending deferred writes first.
+    """
+    if request.args.get("flush") in ("1", "true"):
+        flush_writes()
+    return jsonify({
+        "pid": os.getpid(),
+        "pools": pool_stats(),
+        "write_queue": write_queue_stats(),
+        "user_memory": user_memory_stats(),
+        "llm_client": llm_client_stats(),
+        "summary_queue": summary_jobs.stats(),
+        "context": context_stats(),
+        "circuit": circuit_stats(),
+        "admission": admission_stats(),
+        "idempotency": chat_requests.stats(),
+    })
 
 
 @app.route("/admin/journals_json")
 @admin_required
 def admin_journals_json():
-    """Return journal entries as JSON (date, content)"""
+    """
+    Journal entries newest-first (id, user_id, date, content), paginated.
+    Filters: user_id, date_from, date_to. Pass next_cursor back as ?cursor=.
+    """
     try:
         conn = get_db(JOURNAL_DB)
         if not conn:
-            return jsonify([])
-        c = conn.cursor()
-        c.execute("SELECT id, user_id, date, content FROM journal_entries ORDER BY id DESC")
-        rows = c.fetchall()
-        return jsonify([{"id": r["id"], "user_id": r["user_id"], "date": r["date"], "content": r["content"]} for r in rows])
+            return jsonify(items=[], next_cursor=None)
+        limit, cursor = admin_page_args()
+        where, params = [], []
+        user_id = request.args.get("user_id", type=int)
+        if user_id:
+            where.append("user_id = ?")
+            params.append(user_id)
+        date_range_filters("date", "date_from", "date_to", where, params)
+        rows, next_cursor = keyset_page(
+            conn,
+            "SELECT id, user_id, date, content FROM journal_entries",
+            where, params, limit, cursor,
+        )
+        return jsonify(
+            items=[{"id": r["id"], "user_id": r["user_id"], "date": r["date"], "content": r["content"]} for r in rows],
+            next_cursor=next_cursor,
+            limit=limit,
+        )
     except Exception:
         logger.exception("Failed to return journals JSON")
-        return jsonify([])
+        return jsonify(items=[], next_cursor=None)
 
 
 @app.route("/admin/mood_json")
 @admin_required
 def admin_mood_json():
-    """Return mood logs as JSON (date, mood, message)"""
+    """
+    Mood logs newest-first (id, user_id, date, mood, message), paginated.
+    Filters: user_id, date_from, date_to. Pass next_cursor back as ?cursor=.
+    """
     try:
         conn = get_db(MOOD_DB)
         if not conn:
-            return jsonify([])
-        c = conn.cursor()
-        c.execute("SELECT id, user_id, date, mood, message FROM mood_logs ORDER BY id DESC")
-        rows = c.fetchall()
-        return jsonify([{"id": r["id"], "user_id": r["user_id"], "date": r["date"], "mood": r["mood"], "message": r["message"]} for r in rows])
+            return jsonify(items=[], next_cursor=None)
+        limit, cursor = admin_page_args()
+        where, params = [], []
+        user_id = request.args.get("user_id", type=int)
+        if user_id:
+            where.append("user_id = ?")
+            params.append(user_id)
+        date_range_filters("date", "date_from", "date_to", where, params)
+        rows, next_cursor = keyset_page(
+            conn,
+            "SELECT id, user_id, date, mood, message FROM mood_logs",
+            where, params, limit, cursor,
+        )
+        return jsonify(
+            items=[{"id": r["id"], "user_id": r["user_id"], "date": r["date"], "mood": r["mood"], "message": r["message"]} for r in rows],
+            next_cursor=next_cursor,
+            limit=limit,
+        )
     except Exception:
         logger.exception("Failed to return mood JSON")
-        return jsonify([])
+        return jsonify(items=[], next_cursor=None)
+
+
+# ======================================================
+# Streaming exports (flat memory regardless of table size)
+# ======================================================
+EXPORT_FETCH_SIZE = 500
+
+def iter_query_rows(db_path, sql, params=()):
+    """
+    Yield rows from a dedicated pooled connection, EXPORT_FETCH_SIZE at a
+    time. The connection is held only while the generator is consumed.
+    """
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        pool.release(conn)
+
+def encode_rows(rows, columns, fmt, extra=None):
+    """
+    Serialize row dicts to NDJSON or CSV text chunks (one per fetch batch).
+    `extra` keys are added to every NDJSON object (e.g. a record type).
+    """
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+    else:
+        buf = io.StringIO()
+        writer = None
+
+    for n, row in enumerate(rows, 1):
+        if writer:
+            writer.writerow([row[col] for col in columns])
+        else:
+            record = dict(extra or {})
+            record.update((col, row[col]) for col in columns)
+            buf.write(json.dumps(record, ensure_ascii=False))
+            buf.write("\n")
+        if n % EXPORT_FETCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def streaming_download(chunks, filename, mimetype, gzip=False):
+    # A .gz file download rather than Content-Encoding, so clients keep
+    # the compressed file instead of transparently inflating it
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    headers = {
+        "Content-Disposition": f"attachment;filename={filename}",
+        "X-Accel-Buffering": "no",
+    }
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+class _StreamSink:
+    """Write-only file object for zipfile: collects bytes for the generator to drain."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+def zip_stream(members):
+    """
+    Build a ZIP on the fly from (name, text_chunks) pairs. zipfile writes
+    data descriptors on an unseekable sink, so nothing is buffered beyond
+    the current chunk.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, chunks in members:
+            with zf.open(name, mode="w", force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk.encode("utf-8"))
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+# dataset -> (db, table, exported columns); never export password hashes
+ADMIN_EXPORTS = {
+    "users": (USER_DB, "users", [
+        "id", "username", "email", "email_verified", "is_admin", "auth_provider",
+        "display_name", "intent", "created_at", "last_login",
+    ]),
+    "journals": (JOURNAL_DB, "journal_entries", ["id", "user_id", "date", "content"]),
+    "moods": (MOOD_DB, "mood_logs", ["id", "user_id", "date", "mood", "message"]),
+    "admin_logs": (USER_DB, "admin_logs", ["id", "admin_id", "action", "target_user_id", "timestamp"]),
+}
+
+@app.route("/admin/export/<dataset>")
+@admin_required
+def admin_export(dataset):
+    """
+    Stream a full dataset as NDJSON (default) or CSV (?format=csv), oldest
+    first. ?gzip=1 compresses on the fly; ?since_id=N resumes after the
+    last id already received.
+    """
+    if dataset not in ADMIN_EXPORTS:
+        return jsonify({"status": "failed", "message": "Unknown dataset"}), 404
+
+    db_path, table, columns = ADMIN_EXPORTS[dataset]
+    fmt = "csv" if request.args.get("format") == "csv" else "ndjson"
+    since_id = request.args.get("since_id", 0, type=int)
+    use_gzip = request.args.get("gzip") in ("1", "true")
+
+    defer_write(
+        USER_DB,
+        "INSERT INTO admin_logs (admin_id, action, target_user_id, timestamp) VALUES (?, ?, ?, ?)",
+        (session.get("user_id"), f"export_{dataset}", None, now())
+    )
+
+    rows = iter_query_rows(
+        db_path,
+        f"SELECT {', '.join(columns)} FROM {table} WHERE id > ? ORDER BY id",
+        (since_id,),
+    )
+    return streaming_download(
+        encode_rows(rows, columns, fmt),
+        f"{dataset}.{'csv' if fmt == 'csv' else 'ndjson'}",
+        "text/csv" if fmt == "csv" else "application/x-ndjson",
+        gzip=use_gzip,
+    )
 
 
 @app.route("/")
@@ -2065,28 +2526,109 @@ def chat():
 
     conv_id = session.get("conv_id")
     allow_remote_processing = session.get("allow_remote_processing", True)
+    # Every stage below draws on this budget, so the reply (or the fallback)
+    # is written before gunicorn would kill the worker
+    deadline = Deadline()
+    streaming = bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
+    # Repeats of a keyed message (double-click, client retry, another tab)
+    # get the first request's reply instead of a second LLM call and turn
+    idem_key = chat_idempotency_key()
+    if idem_key is not None and not valid_key(idem_key):
+        return jsonify({"status": "failed", "message": "invalid idempotency key"}), 400
+    if idem_key and conv_id:
+        # the stores use their own pooled connection: hand ours back first
+        # so one request never holds two from the same bounded pool
+        release_dbs()
+        state, result = chat_requests.begin(conv_id, idem_key)
+        if state == PENDING:
+            result = chat_requests.wait(conv_id, idem_key, deadline.remaining()) or {
+                "reply": "I’m still finishing the last message. Just a moment, then you can send again. 💙",
+                "action": None,
+            }
+        if result is not None:
+            return replay_chat_result(result, streaming)
+    else:
+        idem_key = None
 
     try:
-        history = get_history_by_conv_id(conv_id)
+        with stage(deadline, "history", 1.0):
+            history = get_history_by_conv_id(conv_id, limit=CHAT_CONTEXT_MESSAGES)
     except Exception:
         logger.exception("Failed to load history; creating a new conversation")
+        if idem_key:
+            release_dbs()
+            chat_requests.abandon(conv_id, idem_key)
+            idem_key = None
         conv_id = create_empty_conversation()
         session["conv_id"] = conv_id
         history = []
 
-    history.append({"role": "user", "content": message, "ts": now()})
+    user_turn = {"role": "user", "content": message, "ts": now()}
+    history.append(user_turn)
 
-    reply_text, action = generate_reply_with_context(
-        history, conv_id=conv_id, allow_remote_processing=allow_remote_processing
-    )
-
-    history.append({"role": "model", "content": reply_text, "ts": now()})
+    if streaming:
+        return chat_stream(history, conv_id, allow_remote_processing, user_turn, deadline, idem_key)
 
+    completed = False
     try:
-        save_history_by_conv_id(conv_id, history)
-    except Exception:
-        logger.exception("Failed to save history for conv_id=%s", conv_id)
+        reply_text, action = generate_reply_with_context(
+            history,
+            conv_id=conv_id,
+            allow_remote_processing=allow_remote_processing,
+            user_id=session.get("user_id"),
+            deadline=deadline,
+        )
+
+        model_turn = {"role": "model", "content": reply_text, "ts": now()}
+
+        try:
+            with stage(deadline, "save", 1.0):
+                append_messages(conv_id, [user_turn, model_turn])
+        except Exception:
+            logger.exception("Failed to save history for conv_id=%s", conv_id)
 
+        if idem_key:
+            release_dbs()
+            chat_requests.complete(conv_id, idem_key, {"reply": reply_text, "action": action})
+        completed = True
+    finally:
+        if idem_key and not completed:
+            release_dbs()
+            chat_requests.abandon(conv_id, idem_key)
+
+    log_chat_action(conv_id, action, message)
+    update_memory(history, conv_id, allow_remote_processing)
+
+    return jsonify({"reply": reply_text, "action": action})
+
+def chat_idempotency_key():
+    """Idempotency-Key header, or "idempotency_key" in the JSON body."""
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        key = (request.get_json(silent=True) or {}).get("idempotency_key")
+    return key.strip() if isinstance(key, str) else key
+
+def is_chat_replay():
+    """True for a /chat repeat whose idempotency key is already claimed."""
+    key = chat_idempotency_key()
+    conv_id = session.get("conv_id")
+    if not (key and conv_id and valid_key(key)):
+        return False
+    release_dbs()
+    return chat_requests.seen(conv_id, key)
+
+def replay_chat_result(result, streaming):
+    """A stored /chat result, in the shape the client asked for."""
+    if not streaming:
+        return jsonify(result)
+    return Response(
+        sse_event("done", result),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def log_chat_action(conv_id, action, message):
     if action and action.get("type") == "crisis":
         try:
             logger.warning(
@@ -2109,7 +2651,75 @@ def chat():
         except Exception:
             logger.exception("Failed logging breathing event")
 
-    return jsonify({"reply": reply_text, "action": action})
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def chat_stream(history, conv_id, allow_remote_processing, user_turn, deadline=None, idem_key=None):
+    """
+    /chat streaming mode (body {"stream": true} or Accept: text/event-stream).
+    Events:
+      delta  {"text": ...}              model tokens as they arrive
+      done   {"reply": ..., "action": ...}  final cleaned reply (replaces the
+                                         deltas), sent once; short-circuits
+                                         (crisis, breathless, redirect,
+                                         gibberish) send only this
+    The exchange is persisted once, after the reply is complete, and
+    stored under `idem_key` for replays.
+    """
+    user_id = session.get("user_id")
+    message = user_turn["content"]
+
+    @stream_with_context
+    def events():
+        completed = False
+        try:
+            reply_text, action, messages = prepare_reply(
+                history, conv_id, allow_remote_processing, user_id, deadline
+            )
+            if messages is not None:
+                release_dbs()
+                parts = []
+                try:
+                    for delta in stream_openrouter(
+                        messages, timeout=12,
+                        user_id=user_id, priority=is_priority_message(history),
+                        deadline=deadline,
+                    ):
+                        parts.append(delta)
+                        yield sse_event("delta", {"text": delta})
+                except (CircuitOpenError, AdmissionRejected, DeadlineExceeded) as e:
+                    logger.info("%s, serving fallback reply", e)
+                except Exception:
+                    logger.exception("OpenRouter stream failed after %d chunks", len(parts))
+                reply_text = remove_ai_language("".join(parts)).strip() or fallback_reply()
+
+            model_turn = {"role": "model", "content": reply_text, "ts": now()}
+            try:
+                with stage(deadline, "save", 1.0):
+                    append_messages(conv_id, [user_turn, model_turn])
+            except Exception:
+                logger.exception("Failed to save history for conv_id=%s", conv_id)
+            if idem_key:
+                release_dbs()
+                chat_requests.complete(conv_id, idem_key, {"reply": reply_text, "action": action})
+            completed = True
+            log_chat_action(conv_id, action, message)
+
+            yield sse_event("done", {"reply": reply_text, "action": action})
+
+            # After the turn is saved and the client has its reply
+            update_memory(history, conv_id, allow_remote_processing)
+        finally:
+            # client went away (or an error) before the reply was stored
+            if idem_key and not completed:
+                release_dbs()
+                chat_requests.abandon(conv_id, idem_key)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/reset_session")
@@ -2147,7 +2757,7 @@ def save_conversation():
     if not title:
         return jsonify(ok=False, message="Please provide a title")
 
-    history = get_history_by_conv_id(conv_id)
+    history = get_history_by_conv_id(conv_id, limit=1)
     if not history:
         return jsonify(ok=False, message="Nothing to save yet")
 
@@ -2200,7 +2810,7 @@ def load_conversation(chat_id):
 
     row = db.execute(
         """
-        SELECT id, history
+        SELECT id
         FROM conversations
         WHERE id = ? AND user_id = ?
         """,
@@ -2211,8 +2821,9 @@ def load_conversation(chat_id):
         return jsonify(ok=False, message="Chat not found")
 
     try:
-        history = json.loads(row["history"]) if row["history"] else []
+        history = get_history_by_conv_id(row["id"])
     except Exception:
+        logger.exception("Failed to load conversation %s", chat_id)
         history = []
 
     session["conv_id"] = row["id"]
@@ -2227,11 +2838,7 @@ def delete_conversation_route(chat_id):
     if not conn:
         return jsonify({"status": "failed"}), 500
 
-    c = conn.cursor()
-    c.execute(
-        "DELETE FROM conversations WHERE id = ? AND user_id = ?",
-        (chat_id, session.get("user_id"))
-    )
+    delete_conversation_rows(conn, chat_id, session.get("user_id"))
     conn.commit()
 
     return jsonify({"status": "deleted"})
@@ -2295,9 +2902,31 @@ def journaling():
                 saved = True
     return render_template("journaling.html", saved=saved)
 
+_FTS_TERM_RE = re.compile(r"\w+", re.UNICODE)
+# Control characters as highlight markers, so the snippet can be
+# HTML-escaped before they are swapped for <mark> tags.
+_HL_OPEN, _HL_CLOSE = "\x02", "\x03"
+
+def build_fts_query(text):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word is quoted
+    (no operator injection) and prefix-matched, all words required.
+    """
+    terms = _FTS_TERM_RE.findall((text or "").lower())[:12]
+    return " ".join(f'"{t}"*' for t in terms)
+
+def render_snippet(raw):
+    out = html.escape(raw or "")
+    return out.replace(_HL_OPEN, "<mark>").replace(_HL_CLOSE, "</mark>")
+
 @app.route("/search_journals", methods=["GET"])
 @login_required
 def search_journals():
+    """
+    Default: legacy [[date, content], ...] list, substring (LIKE) match.
+    ?mode=ranked: BM25-ranked, paginated FTS search with highlighted
+    snippets ({"results": [...], "page", "per_page", "has_more"}).
+    """
     query = request.args.get("q", "").strip()
     conn = get_db(JOURNAL_DB)
     if not conn:
@@ -2305,6 +2934,42 @@ def search_journals():
 
     c = conn.cursor()
 
+    if request.args.get("mode") == "ranked":
+        page = max(1, request.args.get("page", 1, type=int))
+        per_page = min(50, max(1, request.args.get("per_page", 20, type=int)))
+        match = build_fts_query(query)
+        if not match or not journal_fts_enabled():
+            return jsonify(results=[], page=page, per_page=per_page, has_more=False)
+
+        c.execute(
+            f"""
+            SELECT j.id, j.date,
+                   snippet(journal_fts, 0, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 16) AS snippet,
+                   bm25(journal_fts) AS score
+            FROM journal_fts
+            JOIN journal_entries j ON j.id = journal_fts.rowid
+            WHERE journal_fts MATCH ? AND j.user_id = ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """,
+            (match, session["user_id"], per_page + 1, (page - 1) * per_page),
+        )
+        rows = c.fetchall()
+        return jsonify(
+            results=[
+                {
+                    "id": r["id"],
+                    "date": r["date"],
+                    "snippet": render_snippet(r["snippet"]),
+                    "score": round(-r["score"], 4),
+                }
+                for r in rows[:per_page]
+            ],
+            page=page,
+            per_page=per_page,
+            has_more=len(rows) > per_page,
+        )
+
     if query:
         c.execute(
             """
@@ -2333,25 +2998,19 @@ def search_journals():
 @app.route("/export_journal")
 @login_required
 def export_journal():
-    conn = get_db(JOURNAL_DB)
-    if not conn:
-        text_data = "No journal entries available."
-    else:
-        c = conn.cursor()
-        c.execute(
-    "SELECT date, content FROM journal_entries WHERE user_id = ? ORDER BY id DESC",
-    (session["user_id"],)
-)
+    def chunks():
+        empty = True
+        for row in iter_query_rows(
+            JOURNAL_DB,
+            "SELECT date, content FROM journal_entries WHERE user_id = ? ORDER BY id DESC",
+            (session["user_id"],),
+        ):
+            yield ("" if empty else "\n\n") + f"{row['date']}:\n{row['content']}"
+            empty = False
+        if empty:
+            yield "No journal entries available."
 
-        rows = c.fetchall()
-        text_data = "\n\n".join(
-            [f"{row['date']}:\n{row['content']}" for row in rows]
-        )
-    return Response(
-        text_data,
-        mimetype="text/plain",
-        headers={"Content-Disposition": "attachment;filename=journal.txt"},
-    )
+    return streaming_download(chunks(), "journal.txt", "text/plain")
 
 @app.route("/api/journals/<int:entry_id>", methods=["DELETE"])
 @login_required
@@ -2380,18 +3039,103 @@ def delete_journal_entry(entry_id):
 @login_required
 def export_chat():
     conv_id = session.get("conv_id")
-    history = get_history_by_conv_id(conv_id)
-    if not history:
-        text_data = "No chat history available for this session."
-    else:
-        text_data = "\n\n".join(
-            [f"{m['role'].capitalize()}: {m['content']}" for m in history]
+    # Make sure a legacy blob has been moved into messages before streaming
+    get_history_by_conv_id(conv_id, limit=1)
+
+    def chunks():
+        empty = True
+        for m in iter_query_rows(
+            CONV_DB,
+            """
+            SELECT m.role, m.content FROM messages m
+            JOIN conversations c ON c.id = m.conv_id
+            WHERE m.conv_id = ? AND c.user_id = ?
+            ORDER BY m.seq
+            """,
+            (conv_id, session["user_id"]),
+        ):
+            yield ("" if empty else "\n\n") + f"{m['role'].capitalize()}: {m['content']}"
+            empty = False
+        if empty:
+            yield "No chat history available for this session."
+
+    return streaming_download(chunks(), "chat_history.txt", "text/plain")
+
+@app.route("/export_account")
+@login_required
+def export_account():
+    """
+    Everything we hold for the signed-in user (profile and goals, every
+    conversation with its messages, journal entries, mood logs), streamed
+    straight from the DB cursors. NDJSON by default, one record per line
+    with a "type" field; ?format=zip for a ZIP with one file per store.
+    """
+    user_id = session["user_id"]
+    conn = get_db(CONV_DB)
+    # Legacy conversations still holding a JSON blob: move them into
+    # messages first so the streamed query sees every turn.
+    for row in conn.execute(
+        "SELECT id, history FROM conversations "
+        "WHERE user_id = ? AND history NOT IN ('', '[]')",
+        (user_id,),
+    ).fetchall():
+        explode_history_blob(conn, row["id"], row["history"])
+    conn.commit()
+
+    profile_cols = ["id", "username", "email", "display_name", "intent", "created_at", "goals"]
+    conv_cols = ["conv_id", "title", "created_at", "seq", "role", "content", "ts"]
+    journal_cols = ["id", "date", "content"]
+    mood_cols = ["id", "date", "mood", "message"]
+
+    def sections():
+        yield "profile", profile_cols, iter_query_rows(
+            USER_DB,
+            """
+            SELECT u.id, u.username, u.email, u.display_name, u.intent, u.created_at,
+                   p.goals
+            FROM users u LEFT JOIN user_profile p ON p.user_id = u.id
+            WHERE u.id = ?
+            """,
+            (user_id,),
         )
-    return Response(
-        text_data,
-        mimetype="text/plain",
-        headers={"Content-Disposition": "attachment;filename=chat_history.txt"},
-    )
+        yield "conversations", conv_cols, iter_query_rows(
+            CONV_DB,
+            """
+            SELECT m.conv_id, c.title, c.created_at, m.seq, m.role, m.content, m.ts
+            FROM conversations c
+            JOIN messages m ON m.conv_id = c.id
+            WHERE c.user_id = ?
+            ORDER BY m.conv_id, m.seq
+            """,
+            (user_id,),
+        )
+        yield "journal", journal_cols, iter_query_rows(
+            JOURNAL_DB,
+            "SELECT id, date, content FROM journal_entries WHERE user_id = ? ORDER BY id",
+            (user_id,),
+        )
+        yield "moods", mood_cols, iter_query_rows(
+            MOOD_DB,
+            "SELECT id, date, mood, message FROM mood_logs WHERE user_id = ? ORDER BY id",
+            (user_id,),
+        )
+
+    if request.args.get("format") == "zip":
+        body = zip_stream(
+            (f"{name}.ndjson", encode_rows(rows, cols, "ndjson"))
+            for name, cols, rows in sections()
+        )
+        return Response(
+            stream_with_context(body),
+            mimetype="application/zip",
+            headers={"Content-Disposition": "attachment;filename=theramind_export.zip"},
+        )
+
+    def ndjson():
+        for name, cols, rows in sections():
+            yield from encode_rows(rows, cols, "ndjson", extra={"type": name})
+
+    return streaming_download(ndjson(), "theramind_export.ndjson", "application/x-ndjson")
 
 @app.route("/breathing")
 @login_required
@@ -2500,29 +3244,20 @@ def api_history_moods():
 def api_history_summary():
     user_id = current_user()["id"]
 
-    db_journal = get_db(JOURNAL_DB)
-    db_conv = get_db(CONV_DB)
-    db_mood = get_db(MOOD_DB)
-
-    journal_count = db_journal.execute(
-        "SELECT COUNT(*) FROM journal_entries WHERE user_id = ?",
-        (user_id,)
-    ).fetchone()[0]
-
-    chat_count = db_conv.execute(
-        "SELECT COUNT(*) FROM conversations WHERE user_id = ?",
-        (user_id,)
-    ).fetchone()[0]
-
-    mood_count = db_mood.execute(
-        "SELECT COUNT(*) FROM mood_logs WHERE user_id = ?",
-        (user_id,)
-    ).fetchone()[0]
+    row = get_joined_db().execute(
+        """
+        SELECT
+            COALESCE((SELECT total FROM stats_journals WHERE user_id = :uid), 0) AS journal_count,
+            COALESCE((SELECT total FROM stats_conversations WHERE user_id = :uid), 0) AS chat_count,
+            COALESCE((SELECT total FROM stats_moods WHERE user_id = :uid), 0) AS mood_count
+        """,
+        {"uid": user_id}
+    ).fetchone()
 
     return jsonify({
-        "journal_count": journal_count,
-        "chat_count": chat_count,
-        "mood_count": mood_count
+        "journal_count": row["journal_count"],
+        "chat_count": row["chat_count"],
+        "mood_count": row["mood_count"]
     })
 
 
@@ -2543,7 +3278,7 @@ def ebooks():
 
 # -------------------- Run --------------------
 if __name__ == "__main__":
-    setup_databases()
     port = int(os.environ.get("PORT", 5000))
+    summary_jobs.resume()
     # In production use a WSGI server such as gunicorn and set SESSION_COOKIE_SECURE=True
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable)
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+SLOW_P95_SECONDS = float(os.getenv("CIRCUIT_SLOW_P95_SECONDS", "9"))
+OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+WINDOW = int(os.getenv("CIRCUIT_LATENCY_WINDOW", "50"))
+MIN_SAMPLES = int(os.getenv("CIRCUIT_MIN_SAMPLES", "10"))
+TIMEOUT_FACTOR = float(os.getenv("CIRCUIT_TIMEOUT_FACTOR", "2.0"))
+MIN_TIMEOUT = float(os.getenv("CIRCUIT_MIN_TIMEOUT", "4"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling upstream while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-worker breaker for OpenRouter, shared by all threads of the worker.
+
+    Opens after FAILURE_THRESHOLD consecutive failures, or when the p95 of
+    the last WINDOW call latencies exceeds SLOW_P95_SECONDS. While open,
+    allow() is False and callers serve their fallback at once. After
+    OPEN_SECONDS one probe call is let through (half-open): success closes
+    the circuit, failure reopens it.
+
+    timeout(cap) adapts read timeouts to observed latency: TIMEOUT_FACTOR x
+    p95, at least MIN_TIMEOUT and never above the caller's cap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._latencies = deque(maxlen=WINDOW)
+        self._stats = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    def _p95(self):
+        if len(self._latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _open(self, reason):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+        self._stats["opened"] += 1
+        logger.warning("OpenRouter circuit opened: %s", reason)
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= OPEN_SECONDS:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                # one probe at a time; a probe that never reported back
+                # (e.g. an abandoned stream) frees the slot after OPEN_SECONDS
+                if self._probe_started is None or now - self._probe_started >= OPEN_SECONDS:
+                    self._probe_started = now
+                    return True
+            if self._state == CLOSED:
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self, latency):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            if self._state != CLOSED:
+                # fresh start: the old window describes the outage
+                self._state = CLOSED
+                self._probe_started = None
+                self._latencies.clear()
+                logger.info("OpenRouter circuit closed after a successful probe")
+            self._latencies.append(latency)
+            p95 = self._p95()
+            if p95 is not None and p95 > SLOW_P95_SECONDS:
+                self._open(f"p95 latency {p95:.1f}s")
+                self._latencies.clear()
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._open("probe failed")
+            elif self._state == CLOSED and self._failures >= FAILURE_THRESHOLD:
+                self._open(f"{self._failures} consecutive failures")
+
+    def timeout(self, cap):
+        with self._lock:
+            p95 = self._p95()
+        if p95 is None:
+            return cap
+        return min(cap, max(MIN_TIMEOUT, p95 * TIMEOUT_FACTOR))
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["state"] = self._state
+            out["consecutive_failures"] = self._failures
+            p95 = self._p95()
+            out["p95_ms"] = round(p95 * 1000.0, 1) if p95 is not None else None
+            out["samples"] = len(self._latencies)
+        return out
+
+
+# ======================================================
+# Per-worker instance
+# ======================================================
+_breaker = CircuitBreaker()
+
+
+def circuit_allow():
+    return _breaker.allow()
+
+
+def circuit_success(latency):
+    _breaker.record_success(latency)
+
+
+def circuit_failure():
+    _breaker.record_failure()
+
+
+def adaptive_timeout(cap):
+    return _breaker.timeout(cap)
+
+
+def circuit_stats():
+    return _breaker.stats()
+
+
+def _reset_after_fork():
+    global _breaker
+    _breaker = CircuitBreaker()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,170 @@
+import os
+import math
+import logging
+import threading
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable). The budget is a hard ceiling on the estimated
+# prompt size, system messages included.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_MSG_MAX_TOKENS = int(os.getenv("PROMPT_MSG_MAX_TOKENS", "300"))
+# The latest turn is never trimmed below this, even when the prefix is huge
+PROMPT_LATEST_MIN_TOKENS = int(os.getenv("PROMPT_LATEST_MIN_TOKENS", "64"))
+
+# Calibrated against the gpt-4o tokenizer: English prose averages about 4
+# characters per token, Devanagari and emoji about 2. Every chat message
+# also costs a few tokens of role framing, and the reply is primed with 3.
+CHARS_PER_TOKEN_ASCII = 4.0
+CHARS_PER_TOKEN_OTHER = 2.0
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+def estimate_tokens(text):
+    text = text or ""
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    other = len(text) - ascii_chars
+    return math.ceil(ascii_chars / CHARS_PER_TOKEN_ASCII + other / CHARS_PER_TOKEN_OTHER)
+
+
+def message_tokens(message):
+    return TOKENS_PER_MESSAGE + estimate_tokens(message.get("content"))
+
+
+def prompt_tokens(messages):
+    return TOKENS_PER_REPLY + sum(message_tokens(m) for m in messages)
+
+
+def trim_to_tokens(text, max_tokens):
+    """Cut text so estimate_tokens(text) <= max_tokens, keeping the start."""
+    text = (text or "").strip()
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Worst case is CHARS_PER_TOKEN_OTHER chars per token; grow from there
+    lo, hi = int(max_tokens * CHARS_PER_TOKEN_OTHER), len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip()
+
+
+class ContextPacker:
+    """
+    Fits chat history into a token budget. The prefix (system prompt and
+    memory blocks) is kept; history turns are then added newest first
+    while they fit, each capped at per_msg_max tokens, and older turns are
+    dropped. The latest turn is always kept, trimmed if needed but never
+    below latest_min tokens: if the prefix leaves less room than that,
+    memory blocks are dropped from its end first (the first prefix
+    message, the system prompt, always stays).
+    """
+
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET, per_msg_max=PROMPT_MSG_MAX_TOKENS,
+                 latest_min=PROMPT_LATEST_MIN_TOKENS):
+        self.budget = budget
+        self.per_msg_max = per_msg_max
+        self.latest_min = min(latest_min, per_msg_max)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "max_prompt_tokens": 0,
+            "turns_dropped": 0,
+            "prefix_dropped": 0,
+            "over_budget": 0,
+        }
+
+    def pack(self, prefix, chat_history):
+        """Returns (messages, report) with report["prompt_tokens"] estimated."""
+        msgs = [m for m in chat_history if m.get("role") in ("user", "model")]
+        prefix = list(prefix)
+        prefix_dropped = 0
+        if msgs:
+            floor = TOKENS_PER_MESSAGE + self.latest_min
+            while len(prefix) > 1 and prompt_tokens(prefix) + floor > self.budget:
+                prefix.pop()
+                prefix_dropped += 1
+        remaining = self.budget - prompt_tokens(prefix)
+
+        picked = []
+        for m in reversed(msgs):
+            role = "assistant" if m["role"] == "model" else m["role"]
+            content = trim_to_tokens(m["content"], self.per_msg_max)
+            cost = TOKENS_PER_MESSAGE + estimate_tokens(content)
+            if cost > remaining:
+                if picked:
+                    break
+                content = trim_to_tokens(
+                    content, max(remaining - TOKENS_PER_MESSAGE, self.latest_min)
+                )
+                cost = TOKENS_PER_MESSAGE + estimate_tokens(content)
+            picked.append({"role": role, "content": content})
+            remaining -= cost
+        picked.reverse()
+
+        messages = list(prefix) + picked
+        report = {
+            "prompt_tokens": prompt_tokens(messages),
+            "budget": self.budget,
+            "turns": len(picked),
+            "dropped": len(msgs) - len(picked),
+            "prefix_dropped": prefix_dropped,
+        }
+        self._record(report)
+        return messages, report
+
+    def _record(self, report):
+        with self._lock:
+            s = self._stats
+            s["calls"] += 1
+            s["prompt_tokens"] += report["prompt_tokens"]
+            s["max_prompt_tokens"] = max(s["max_prompt_tokens"], report["prompt_tokens"])
+            s["turns_dropped"] += report["dropped"]
+            s["prefix_dropped"] += report["prefix_dropped"]
+            if report["prompt_tokens"] > report["budget"]:
+                # only when the system prompt alone leaves no room
+                s["over_budget"] += 1
+                logger.warning(
+                    "Prompt over budget: ~%d tokens (budget %d)",
+                    report["prompt_tokens"], report["budget"]
+                )
+        logger.info(
+            "Prompt packed: ~%d tokens (budget %d), %d turns, %d dropped",
+            report["prompt_tokens"], report["budget"], report["turns"], report["dropped"]
+        )
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+        out["avg_prompt_tokens"] = round(out["prompt_tokens"] / out["calls"], 1) if out["calls"] else 0.0
+        out["budget"] = self.budget
+        return out
+
+
+# ======================================================
+# Per-worker instance
+# ======================================================
+_packer = ContextPacker()
+
+
+def pack_messages(prefix, chat_history):
+    return _packer.pack(prefix, chat_history)
+
+
+def context_stats():
+    return _packer.stats()
+
+
+def _reset_after_fork():
+    global _packer
+    _packer = ContextPacker()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,203 @@
+import os
+import queue
+import sqlite3
+import logging
+import threading
+import time
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+
+
+def foreign_key_parents_present(conn):
+    """
+    True when every FOREIGN KEY points at a table in the same file (checked
+    for main and any ATTACHed schema). SQLite cannot enforce references
+    across files, and with enforcement ON writes to such a child table fail
+    with "no such table: main.users".
+    """
+    for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+        tables = {
+            r[0] for r in conn.execute(
+                f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'"
+            )
+        }
+        for table in tables:
+            for fk in conn.execute(f"PRAGMA {schema}.foreign_key_list('{table}')"):
+                if fk[2] not in tables:
+                    return False
+    return True
+
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of long-lived sqlite connections for one DB file.
+    Connections are opened once (WAL, synchronous=NORMAL, busy_timeout,
+    mmap, page cache) and handed back and forth between requests.
+    `attach` maps schema aliases to extra DB files ATTACHed on every
+    connection, so one connection can join across stores.
+    """
+
+    def __init__(self, db_path, max_size=POOL_SIZE, timeout=POOL_TIMEOUT, attach=None):
+        self.db_path = db_path
+        self.attach = dict(attach or {})
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        for alias, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+            conn.execute(f"PRAGMA {alias}.synchronous = NORMAL")
+            conn.execute(f"PRAGMA {alias}.cache_size = -{CACHE_SIZE_KB}")
+
+        # 🔹 Enable foreign key enforcement (required for ON DELETE CASCADE)
+        if foreign_key_parents_present(conn):
+            conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def acquire(self, timeout=None):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["hits"] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.max_size
+            if can_open:
+                self._opened += 1
+                self._stats["misses"] += 1
+
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        # Pool exhausted: wait for a connection to come back
+        started = time.monotonic()
+        try:
+            conn = self._idle.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise sqlite3.OperationalError(
+                f"connection pool exhausted for {os.path.basename(self.db_path)}"
+            )
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_time_ms"] += (time.monotonic() - started) * 1000.0
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            logger.exception("Discarding broken pooled connection")
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+            self._stats["discarded"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["open"] = self._opened
+        out["idle"] = self._idle.qsize()
+        out["max_size"] = self.max_size
+        out["wait_time_ms"] = round(out["wait_time_ms"], 2)
+        return out
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+# ======================================================
+# Per-worker registry
+# ======================================================
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, attach=None, **kwargs):
+    key = db_path
+    if attach:
+        key += "+" + "+".join(sorted(attach))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_path, attach=attach, **kwargs)
+                _pools[key] = pool
+    return pool
+
+
+def pool_stats():
+    return {os.path.basename(key): pool.stats() for key, pool in list(_pools.items())}
+
+
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+
+def _reset_after_fork():
+    # sqlite connections must never be shared across processes; a forked
+    # gunicorn worker starts with an empty registry of its own.
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,58 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable). The /chat deadline stays under gunicorn's
+# default 30s worker timeout so a reply is always written before a kill.
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+# Time held back at the end for saving the turn and writing the response
+DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "1.5"))
+# An LLM attempt (or retry) with less time than this left is not started
+MIN_ATTEMPT_SECONDS = float(os.getenv("MIN_ATTEMPT_SECONDS", "3"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Not enough of the request's time budget left to start a stage."""
+
+
+class Deadline:
+    """
+    Absolute time budget for one request, handed to every stage of the chat
+    pipeline. Stages size their timeouts with remaining() and skip optional
+    or retried work when allows() says it would not fit.
+    """
+
+    def __init__(self, seconds=CHAT_DEADLINE_SECONDS, reserve=DEADLINE_RESERVE_SECONDS):
+        self.started = time.monotonic()
+        self.expires = self.started + seconds
+        self.reserve = reserve
+
+    def remaining(self):
+        """Seconds left for work, after holding back the reserve."""
+        return max(0.0, self.expires - self.reserve - time.monotonic())
+
+    def allows(self, seconds):
+        return self.remaining() >= seconds
+
+    def cap(self, timeout):
+        """`timeout` shortened to what is left."""
+        return min(timeout, self.remaining())
+
+
+@contextmanager
+def stage(deadline, name, budget):
+    """Time one pipeline stage and log it if it overran its budget."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        took = time.monotonic() - started
+        if took > budget:
+            logger.warning(
+                "Stage %s overran its budget: %.0fms (budget %.0fms, %s)",
+                name, took * 1000.0, budget * 1000.0,
+                f"{deadline.remaining():.1f}s left" if deadline is not None else "no deadline"
+            )
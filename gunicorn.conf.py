@@ -0,0 +1,49 @@
+"""
+Gunicorn settings (Procfile: web: gunicorn -c gunicorn.conf.py app:app).
+
+Threaded workers (gthread): each process serves GUNICORN_THREADS requests
+at once, so /chat requests waiting on OpenRouter no longer pin a whole
+process each. gthread rather than gevent: sqlite3 and numpy calls would
+block a gevent hub, while they release the GIL for other threads.
+
+Per-worker state (DB pools, write queue, OpenRouter session, caches,
+circuit breaker) is lock-protected and reset after fork, so preload_app
+is safe and shares imported code between workers. With preload_app the
+master's own DB connections (migrations, admin seeding) are closed in
+pre_fork, before any worker is forked.
+"""
+import os
+
+bind = "0.0.0.0:" + os.getenv("PORT", "8000")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# Long enough for a streamed reply; gthread heartbeats from the main thread,
+# so this only catches a worker that is truly stuck
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+accesslog = "-"
+errorlog = "-"
+
+# Enough keep-alive OpenRouter connections for every thread (llm_client.py)
+os.environ.setdefault("OPENROUTER_POOL_SIZE", str(threads))
+
+
+
+def pre_fork(server, worker):
+    # Workers drop inherited pools without closing them (db_pool.py); close
+    # the master's here so no sqlite handle is shared with a child
+    from db_pool import close_all_pools
+    close_all_pools()
+
+
+def post_worker_init(worker):
+    # Summary jobs left pending by the last run do not wait for a new
+    # enqueue (summary_queue.py); never started in the master
+    from summary_queue import resume_queues
+    resume_queues()
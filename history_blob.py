@@ -0,0 +1,35 @@
+"""
+Legacy conversation history blobs.
+
+Conversations used to keep their whole history as one JSON array in
+conversations.history. Turns now live one row each in messages; the app
+explodes a blob on first touch and `python migrations.py` backfills the
+rest, both through explode_history_blob().
+"""
+import json
+import logging
+
+logger = logging.getLogger("theramind")
+
+
+def explode_history_blob(conn, conv_id, raw_history):
+    """
+    Move a conversations.history JSON blob into the messages table and
+    blank the blob. Returns the number of entries read, or None when the
+    blob is not valid JSON (it is then left as is). Caller commits.
+    """
+    try:
+        history = json.loads(raw_history) if raw_history else []
+    except ValueError:
+        logger.warning("Unreadable history blob for conv_id=%s, leaving as is", conv_id)
+        return None
+    conn.executemany(
+        "INSERT OR IGNORE INTO messages (conv_id, seq, role, content, ts) VALUES (?, ?, ?, ?, ?)",
+        [
+            (conv_id, seq, m.get("role"), m.get("content") or "", m.get("ts"))
+            for seq, m in enumerate(history)
+            if isinstance(m, dict) and m.get("role")
+        ]
+    )
+    conn.execute("UPDATE conversations SET history = '[]' WHERE id = ?", (conv_id,))
+    return len(history)
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from db_pool import get_pool
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+# A pending claim older than this belongs to a request that died mid-way
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "40"))
+POLL_INTERVAL = 0.2
+PURGE_EVERY = 100
+MAX_KEY_LENGTH = 128
+
+NEW, DONE, PENDING = "new", "done", "pending"
+
+_stores = []
+
+
+class IdempotencyStore:
+    """
+    Client-supplied idempotency keys for /chat, kept per conversation in
+    chat_requests for IDEMPOTENCY_TTL seconds.
+
+    The first request with a key claims it (status 'pending') and does the
+    work; complete() stores the reply. A repeat while the first is still
+    running waits for that result instead of calling the LLM again (in
+    the same worker via an Event, across workers by polling the row), and
+    a repeat after it finished gets the stored result straight away.
+    """
+
+    def __init__(self, db_path):
+        _stores.append(self)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._events = {}
+        self._stats = {"claimed": 0, "replayed": 0, "coalesced": 0, "abandoned": 0}
+
+    def _execute(self, sql, params=()):
+        pool = get_pool(self.db_path)
+        conn = pool.acquire()
+        try:
+            with conn:
+                cur = conn.execute(sql, params)
+                return cur.fetchall(), cur.rowcount
+        finally:
+            pool.release(conn)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def begin(self, conv_id, key):
+        """
+        Returns (NEW, None) when this request owns the key, (DONE, result)
+        for a finished repeat, or (PENDING, None) while another request
+        holds it.
+        """
+        now = time.time()
+        _, inserted = self._execute(
+            "INSERT INTO chat_requests (conv_id, key, status, created_at) "
+            "VALUES (?, ?, 'pending', ?) ON CONFLICT(conv_id, key) DO NOTHING",
+            (conv_id, key, now)
+        )
+        if not inserted:
+            # Take over claims that expired or were left behind by a dead request
+            _, inserted = self._execute(
+                """
+                UPDATE chat_requests SET status = 'pending', result = NULL, created_at = ?
+                WHERE conv_id = ? AND key = ? AND (
+                    created_at < ? OR (status = 'pending' AND created_at < ?)
+                )
+                """,
+                (now, conv_id, key, now - IDEMPOTENCY_TTL, now - IDEMPOTENCY_LEASE)
+            )
+        if inserted:
+            with self._lock:
+                self._events[(conv_id, key)] = threading.Event()
+                self._stats["claimed"] += 1
+                purge = self._stats["claimed"] % PURGE_EVERY == 0
+            if purge:
+                self.purge()
+            return NEW, None
+
+        result = self._result(conv_id, key)
+        if result is not None:
+            self._count("replayed")
+            return DONE, result
+        return PENDING, None
+
+    def seen(self, conv_id, key):
+        """True while this key has a live claim or stored result (a repeat)."""
+        rows, _ = self._execute(
+            "SELECT 1 FROM chat_requests WHERE conv_id = ? AND key = ? AND created_at >= ?",
+            (conv_id, key, time.time() - IDEMPOTENCY_TTL)
+        )
+        return bool(rows)
+
+    def _result(self, conv_id, key):
+        rows, _ = self._execute(
+            "SELECT result FROM chat_requests WHERE conv_id = ? AND key = ? AND status = 'done'",
+            (conv_id, key)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def wait(self, conv_id, key, timeout):
+        """The owner's result once it finishes, or None on timeout/abandon."""
+        self._count("coalesced")
+        with self._lock:
+            event = self._events.get((conv_id, key))
+        until = time.monotonic() + timeout
+        while True:
+            rows, _ = self._execute(
+                "SELECT status, result FROM chat_requests WHERE conv_id = ? AND key = ?",
+                (conv_id, key)
+            )
+            if not rows:
+                return None
+            if rows[0][0] == "done":
+                return json.loads(rows[0][1])
+            left = until - time.monotonic()
+            if left <= 0:
+                return None
+            if event is not None:
+                event.wait(min(left, POLL_INTERVAL * 5))
+            else:
+                time.sleep(min(left, POLL_INTERVAL))
+
+    def complete(self, conv_id, key, result):
+        self._execute(
+            "UPDATE chat_requests SET status = 'done', result = ? WHERE conv_id = ? AND key = ?",
+            (json.dumps(result), conv_id, key)
+        )
+        self._release(conv_id, key)
+
+    def abandon(self, conv_id, key):
+        """Drop an unfinished claim so a retry with the same key runs again."""
+        self._execute(
+            "DELETE FROM chat_requests WHERE conv_id = ? AND key = ? AND status = 'pending'",
+            (conv_id, key)
+        )
+        self._count("abandoned")
+        self._release(conv_id, key)
+
+    def _release(self, conv_id, key):
+        with self._lock:
+            event = self._events.pop((conv_id, key), None)
+        if event is not None:
+            event.set()
+
+    def purge(self):
+        """Delete keys past their TTL; returns how many."""
+        _, deleted = self._execute(
+            "DELETE FROM chat_requests WHERE created_at < ?",
+            (time.time() - IDEMPOTENCY_TTL,)
+        )
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._events)
+        rows, _ = self._execute("SELECT COUNT(*) FROM chat_requests")
+        out["stored"] = rows[0][0]
+        return out
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._events = {}
+
+
+def valid_key(key):
+    return bool(key) and len(key) <= MAX_KEY_LENGTH and key.isprintable()
+
+
+def _reset_after_fork():
+    for store in _stores:
+        store.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,145 @@
+import os
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable). OPENROUTER_BASE_URL can point at a local stub.
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+POOL_SIZE = int(os.getenv("OPENROUTER_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", "12"))
+
+
+class LLMClient:
+    """
+    Per-worker keep-alive HTTP client for OpenRouter. One requests.Session
+    with a pooled adapter, so chat replies and memory summaries reuse warm
+    TCP+TLS connections instead of handshaking on every call. Retries stay
+    with the callers (call_openrouter_with_retries), not the adapter.
+    """
+
+    def __init__(self, base_url=OPENROUTER_BASE_URL, pool_size=POOL_SIZE):
+        self.base_url = base_url
+        self.pool_size = max(1, pool_size)
+        self._session = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0}
+        self._usage = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    s = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_size,
+                        max_retries=0,
+                        pool_block=False,
+                    )
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session = s
+        return self._session
+
+    def post(self, path, read_timeout=READ_TIMEOUT, **kwargs):
+        """POST to base_url + path with (connect, read) timeouts."""
+        with self._lock:
+            self._stats["requests"] += 1
+        try:
+            return self.session.post(
+                self.base_url + path,
+                timeout=(CONNECT_TIMEOUT, read_timeout),
+                **kwargs
+            )
+        except requests.RequestException:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+    def record_usage(self, usage):
+        """
+        Account one completion's `usage` block. cached_tokens is the part of
+        the prompt the provider served from its prefix cache.
+        """
+        if not usage:
+            return
+        prompt = int(usage.get("prompt_tokens") or 0)
+        cached = int((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        with self._lock:
+            u = self._usage
+            u["calls"] += 1
+            u["prompt_tokens"] += prompt
+            u["cached_tokens"] += cached
+            u["completion_tokens"] += completion
+        logger.info(
+            "OpenRouter usage: %d prompt tokens (%d cached, %d uncached), %d completion",
+            prompt, cached, prompt - cached, completion
+        )
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            usage = dict(self._usage)
+        # urllib3 counts the connections each host pool has opened; every
+        # request beyond that went over a reused keep-alive connection
+        opened = 0
+        if self._session is not None:
+            adapters = {id(a): a for a in self._session.adapters.values()}
+            for adapter in adapters.values():
+                for pool in list(adapter.poolmanager.pools._container.values()):
+                    opened += pool.num_connections
+        out["connections_opened"] = opened
+        out["reused"] = max(0, out["requests"] - out["errors"] - opened)
+        out["pool_size"] = self.pool_size
+        usage["uncached_tokens"] = usage["prompt_tokens"] - usage["cached_tokens"]
+        usage["cache_hit_ratio"] = (
+            round(usage["cached_tokens"] / usage["prompt_tokens"], 3) if usage["prompt_tokens"] else 0.0
+        )
+        out["usage"] = usage
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+# ======================================================
+# Per-worker instance
+# ======================================================
+_client = LLMClient()
+
+
+def llm_post(path, read_timeout=READ_TIMEOUT, **kwargs):
+    return _client.post(path, read_timeout=read_timeout, **kwargs)
+
+
+def record_usage(usage):
+    _client.record_usage(usage)
+
+
+def llm_client_stats():
+    return _client.stats()
+
+
+def _reset_after_fork():
+    # Sockets must not be shared with the parent; the worker opens its own
+    global _client
+    _client = LLMClient()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
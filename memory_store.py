@@ -0,0 +1,231 @@
+"""
+Bounded, deduplicated per-conversation memory store.
+
+A conversation keeps at most MEMORY_MAX_PER_CONV summaries. Every summary
+carries a MinHash signature of its word shingles; a new summary whose
+estimated Jaccard similarity to a stored one reaches MEMORY_DEDUP_THRESHOLD
+replaces it instead of adding a row. Beyond the cap, the oldest go.
+
+Each summary's L2-normalized term vector is computed once, at write time,
+and stored as postings in memory_terms (an inverted index keyed by
+conversation and term), so retrieval only touches memories that share a
+term with the query.
+"""
+import os
+import re
+import math
+import zlib
+import heapq
+from array import array
+
+MEMORY_MAX_PER_CONV = int(os.getenv("MEMORY_MAX_PER_CONV", "8"))
+MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.5"))
+# Weight shared terms by inverse document frequency within the conversation
+MEMORY_RETRIEVAL_IDF = os.getenv("MEMORY_RETRIEVAL_IDF", "1") not in ("0", "false")
+MAX_QUERY_TERMS = 32
+
+SHINGLE_SIZE = 2
+NUM_PERM = 64
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _make_perms(n, seed=0x9E3779B97F4A7C15):
+    # Fixed LCG sequence so signatures stay comparable across workers and restarts
+    perms, x = [], seed
+    for _ in range(n):
+        x = (x * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        a = (x >> 3) % _PRIME or 1
+        x = (x * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        perms.append((a, (x >> 3) % _PRIME))
+    return perms
+
+
+_PERMS = _make_perms(NUM_PERM)
+
+_WORD_RE = re.compile(r"\b[a-zA-Z']{2,}\b")
+
+
+def tokenize(text):
+    text = (text or "").lower()
+    return _WORD_RE.findall(text)
+
+
+def build_tf_vector(text):
+    tokens = tokenize(text)
+    vec = {}
+    for t in tokens:
+        vec[t] = vec.get(t, 0) + 1
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    for k in list(vec.keys()):
+        vec[k] = vec[k] / norm
+    return vec
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    words = tokenize(text)
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + k]).encode("utf-8"))
+        for i in range(len(words) - k + 1)
+    }
+
+
+def minhash(text):
+    """NUM_PERM x uint32 MinHash signature, packed for a BLOB column."""
+    hashes = shingles(text)
+    if not hashes:
+        return array("I", [_MAX_HASH] * NUM_PERM).tobytes()
+    sig = array("I", (
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMS
+    ))
+    return sig.tobytes()
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two minhash() signatures."""
+    if not sig_a or not sig_b:
+        return 0.0
+    a, b = array("I"), array("I")
+    a.frombytes(sig_a)
+    b.frombytes(sig_b)
+    if len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def index_memory(conn, conv_id, memory_id, summary):
+    """(Re)write the postings for one memory."""
+    conn.execute("DELETE FROM memory_terms WHERE memory_id = ?", (memory_id,))
+    conn.executemany(
+        "INSERT INTO memory_terms (conv_id, term, memory_id, weight) VALUES (?, ?, ?, ?)",
+        [(conv_id, term, memory_id, w) for term, w in build_tf_vector(summary).items()]
+    )
+
+
+def store_memory(conn, conv_id, summary, ts):
+    """
+    Add a summary for conv_id, replacing a near-duplicate if there is one
+    and trimming the conversation to MEMORY_MAX_PER_CONV. Runs in the
+    caller's transaction.
+    """
+    sig = minhash(summary)
+    rows = conn.execute(
+        "SELECT id, signature FROM memories WHERE conv_id = ? ORDER BY updated_at DESC",
+        (conv_id,)
+    ).fetchall()
+
+    best_id, best = None, 0.0
+    for mem_id, other in rows:
+        score = similarity(sig, other)
+        if score > best:
+            best_id, best = mem_id, score
+
+    if best_id is not None and best >= MEMORY_DEDUP_THRESHOLD:
+        conn.execute(
+            "UPDATE memories SET summary = ?, signature = ?, updated_at = ? WHERE id = ?",
+            (summary, sig, ts, best_id)
+        )
+        index_memory(conn, conv_id, best_id, summary)
+        return best_id
+
+    cur = conn.execute(
+        "INSERT INTO memories (conv_id, summary, signature, updated_at) VALUES (?, ?, ?, ?)",
+        (conv_id, summary, sig, ts)
+    )
+    index_memory(conn, conv_id, cur.lastrowid, summary)
+    # postings of trimmed rows go with them (memories_terms_ad trigger)
+    if len(rows) >= MEMORY_MAX_PER_CONV:
+        conn.executemany(
+            "DELETE FROM memories WHERE id = ?",
+            [(r[0],) for r in rows[MEMORY_MAX_PER_CONV - 1:]]
+        )
+    return cur.lastrowid
+
+
+def search_memories(conn, conv_id, query, top_k=3):
+    """
+    Top-k summaries for query, best first. Scores are the dot product of
+    the stored and query term vectors (cosine, as both are normalized),
+    optionally IDF-weighted. Only postings for the query's terms are read.
+    """
+    q_vec = build_tf_vector(query)
+    if not q_vec or top_k <= 0:
+        return []
+    terms = heapq.nlargest(MAX_QUERY_TERMS, q_vec, key=q_vec.get)
+
+    postings = conn.execute(
+        f"SELECT term, memory_id, weight FROM memory_terms "
+        f"WHERE conv_id = ? AND term IN ({', '.join('?' * len(terms))})",
+        (conv_id, *terms)
+    ).fetchall()
+    if not postings:
+        return []
+
+    idf = {}
+    if MEMORY_RETRIEVAL_IDF:
+        n = conn.execute(
+            "SELECT COUNT(*) FROM memories WHERE conv_id = ?", (conv_id,)
+        ).fetchone()[0] or 1
+        df = {}
+        for term, _, _ in postings:
+            df[term] = df.get(term, 0) + 1
+        idf = {t: math.log(1.0 + n / d) for t, d in df.items()}
+
+    scores = {}
+    for term, memory_id, weight in postings:
+        scores[memory_id] = scores.get(memory_id, 0.0) + q_vec[term] * weight * idf.get(term, 1.0)
+    best = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+
+    ids = [memory_id for memory_id, _ in best]
+    summaries = dict(conn.execute(
+        f"SELECT id, summary FROM memories WHERE id IN ({', '.join('?' * len(ids))})",
+        ids
+    ).fetchall())
+    return [summaries[i] for i in ids if summaries.get(i)]
+
+
+def compact_conversation(conn, conv_id):
+    """
+    Collapse existing near-duplicates (newest wins) and apply the cap.
+    Also fills in signatures and postings for rows written before they
+    existed.
+    Returns the number of rows removed.
+    """
+    rows = conn.execute(
+        "SELECT id, summary, signature FROM memories WHERE conv_id = ? "
+        "ORDER BY updated_at DESC, id DESC",
+        (conv_id,)
+    ).fetchall()
+
+    kept, keep_rows, drop, fill = [], [], [], []
+    for mem_id, summary, sig in rows:
+        if not summary:
+            drop.append(mem_id)
+            continue
+        if not sig:
+            sig = minhash(summary)
+            fill.append((sig, mem_id))
+        if len(kept) >= MEMORY_MAX_PER_CONV or any(
+            similarity(sig, k) >= MEMORY_DEDUP_THRESHOLD for k in kept
+        ):
+            drop.append(mem_id)
+        else:
+            kept.append(sig)
+            keep_rows.append((mem_id, summary))
+
+    dropped = set(drop)
+    conn.executemany(
+        "UPDATE memories SET signature = ? WHERE id = ?",
+        [f for f in fill if f[1] not in dropped]
+    )
+    indexed = {r[0] for r in conn.execute(
+        "SELECT DISTINCT memory_id FROM memory_terms WHERE conv_id = ?", (conv_id,)
+    )}
+    for mem_id, summary in keep_rows:
+        if mem_id not in indexed:
+            index_memory(conn, conv_id, mem_id, summary)
+    conn.executemany("DELETE FROM memories WHERE id = ?", [(i,) for i in drop])
+    return len(drop)
@@ -0,0 +1,35 @@
+# migrate_journal_fts.py
+# (Re)build the FTS5 journal search index from journal_entries.
+# The app creates journal_fts and its sync triggers on startup; run this
+# after bulk imports, restores, or if the index is suspected to be stale.
+import sqlite3
+import sys
+
+from migrations import default_paths
+
+DB = default_paths()["journal"]
+
+
+def run():
+    conn = sqlite3.connect(DB, timeout=30)
+    c = conn.cursor()
+
+    if not c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_fts'"
+    ).fetchone():
+        print("journal_fts not found; start the app once to create it.")
+        sys.exit(1)
+
+    c.execute("INSERT INTO journal_fts(journal_fts) VALUES ('rebuild')")
+    c.execute("INSERT INTO journal_fts(journal_fts) VALUES ('optimize')")
+    conn.commit()
+
+    # integrity-check raises if the index disagrees with journal_entries
+    c.execute("INSERT INTO journal_fts(journal_fts, rank) VALUES ('integrity-check', 1)")
+    n = c.execute("SELECT COUNT(*) FROM journal_entries").fetchone()[0]
+    conn.close()
+    print(f"✓ journal_fts rebuilt ({n} entries indexed)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,109 @@
+# migrate_merge_databases.py
+# Merge conversations.db, journal.db, mood_data.db and users.db into a single
+# theramind.db (for DB_MODE=single). Source files are left untouched.
+#
+#   python migrate_merge_databases.py [--purge-orphans]
+#
+# --purge-orphans drops rows whose user/conversation no longer exists. Those
+# rows pile up in split mode because ON DELETE CASCADE could never fire.
+import sqlite3
+import os
+import sys
+
+from migrations import db_dir
+
+DB_DIR = db_dir()
+TARGET = os.path.join(DB_DIR, "theramind.db")
+
+# users first so the parent tables exist before their children
+SOURCES = [
+    ("src_users", "users.db"),
+    ("src_conv", "conversations.db"),
+    ("src_journal", "journal.db"),
+    ("src_mood", "mood_data.db"),
+]
+
+ORPHAN_CHECKS = [
+    ("conversations", "user_id NOT IN (SELECT id FROM users)"),
+    ("journal_entries", "user_id NOT IN (SELECT id FROM users)"),
+    ("mood_logs", "user_id NOT IN (SELECT id FROM users)"),
+    ("messages", "conv_id NOT IN (SELECT id FROM conversations)"),
+    ("memories", "conv_id NOT IN (SELECT id FROM conversations)"),
+]
+
+
+def run(purge_orphans=False):
+    if os.path.exists(TARGET):
+        print(f"{TARGET} already exists; move it away before merging.")
+        sys.exit(1)
+
+    conn = sqlite3.connect(TARGET)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA foreign_keys = OFF")
+    c = conn.cursor()
+
+    for alias, filename in SOURCES:
+        path = os.path.join(DB_DIR, filename)
+        if not os.path.exists(path):
+            print(f"Skipping {filename} (not found)")
+            continue
+
+        c.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        objects = c.execute(
+            f"""
+            SELECT type, name, sql FROM {alias}.sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END
+            """
+        ).fetchall()
+
+        # FTS tables (with their shadow tables and sync triggers) are recreated
+        # and rebuilt by the app on startup rather than copied, and so is
+        # schema_version (each source file has its own)
+        virtual = [n for t, n, sql in objects if sql.upper().startswith("CREATE VIRTUAL TABLE")]
+        objects = [
+            o for o in objects
+            if o[1] != "schema_version"
+            and not any(o[1] == v or o[1].startswith(v + "_") for v in virtual)
+        ]
+
+        # Tables (schema copied verbatim, so ALTERed column order is kept)
+        for obj_type, name, sql in objects:
+            if obj_type != "table":
+                continue
+            c.execute(sql)
+            c.execute(f"INSERT INTO main.{name} SELECT * FROM {alias}.{name}")
+            print(f"✓ {filename}: {name} ({c.rowcount} rows)")
+
+        # Indexes / triggers after the data is in
+        for obj_type, name, sql in objects:
+            if obj_type == "table":
+                continue
+            try:
+                c.execute(sql)
+            except sqlite3.Error as e:
+                print(f"• {filename}: {name}: {e}")
+
+        conn.commit()
+        c.execute(f"DETACH DATABASE {alias}")
+
+    tables = {r[0] for r in c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, predicate in ORPHAN_CHECKS:
+        if table not in tables:
+            continue
+        n = c.execute(f"SELECT COUNT(*) FROM {table} WHERE {predicate}").fetchone()[0]
+        if not n:
+            continue
+        if purge_orphans:
+            c.execute(f"DELETE FROM {table} WHERE {predicate}")
+            print(f"✓ purged {n} orphaned rows from {table}")
+        else:
+            print(f"• {n} orphaned rows in {table} (rerun with --purge-orphans to drop)")
+
+    conn.commit()
+    conn.close()
+    print("Merge complete. Start the app with DB_MODE=single.")
+
+
+if __name__ == "__main__":
+    run(purge_orphans="--purge-orphans" in sys.argv)
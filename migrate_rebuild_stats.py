@@ -0,0 +1,47 @@
+# migrate_rebuild_stats.py
+# Consistency check / rebuild for the materialized activity counters
+# (stats_conversations, stats_journals, stats_moods, stats_users).
+#
+#   python migrate_rebuild_stats.py           # check, rebuild drifted tables
+#   python migrate_rebuild_stats.py --check   # report only
+#   python migrate_rebuild_stats.py --force   # rebuild everything
+import sqlite3
+import os
+import sys
+
+from activity_stats import COUNTERS, check_counters, ensure_counters, rebuild_counters
+from migrations import default_paths
+
+DBS = default_paths()
+
+
+def run(check_only=False, force=False):
+    drifted = 0
+    for spec in COUNTERS:
+        path = DBS[spec["store"]]
+        if not os.path.exists(path):
+            print(f"Skipping {spec['table']} ({os.path.basename(path)} not found)")
+            continue
+
+        conn = sqlite3.connect(path, timeout=30)
+        ensure_counters(conn, spec)
+        mismatches = check_counters(conn, spec)
+        drifted += len(mismatches)
+        for user_id, col, stored, actual in mismatches[:20]:
+            print(f"• {spec['table']} user_id={user_id} {col}: stored {stored}, actual {actual}")
+        if len(mismatches) > 20:
+            print(f"• … {len(mismatches) - 20} more in {spec['table']}")
+
+        if force or (mismatches and not check_only):
+            rebuild_counters(conn, spec)
+            print(f"✓ rebuilt {spec['table']}")
+        elif not mismatches:
+            print(f"✓ {spec['table']} consistent")
+        conn.close()
+
+    if check_only and drifted:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run(check_only="--check" in sys.argv, force="--force" in sys.argv)
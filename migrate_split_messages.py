@@ -0,0 +1,20 @@
+# migrate_split_messages.py
+# Explode legacy conversations.history JSON blobs into the messages table.
+# Runs in small batches (one transaction each) so it can run next to live traffic.
+# Same as `python migrations.py`, limited to this one backfill.
+import sys
+
+from migrations import default_paths, migrate, run_backfills
+
+BATCH_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+
+def run():
+    paths = default_paths()
+    migrate(paths)
+    run_backfills(paths, batch_size=BATCH_SIZE, only={"messages"})
+    print("Messages migration complete.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,727 @@
+# migrations.py
+# Versioned schema migrations for every store.
+#
+# Each DB file carries a schema_version table. The app calls migrate() at
+# import time: when every file is already current that is one query on one
+# connection; otherwise the pending migrations for each file run in a
+# single BEGIN IMMEDIATE transaction, so workers booting together during a
+# rolling restart apply them exactly once.
+#
+# Data backfills are not run at startup. They run online, in bounded
+# keyset-paginated chunks (one short transaction each), from the CLI:
+#
+#   python migrations.py                      # schema + every backfill
+#   python migrations.py --status             # versions and pending work only
+#   python migrations.py --batch-size 500
+#   python migrations.py --owner-id 1         # legacy rows without user_id
+#   python migrations.py --only memories.compact
+import sqlite3
+import os
+import sys
+import logging
+import datetime
+
+from activity_stats import COUNTERS, create_counters
+from history_blob import explode_history_blob
+from memory_store import compact_conversation
+from user_memory import remember
+
+logger = logging.getLogger("theramind")
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+STORES = ("users", "mood", "journal", "conv")
+
+
+def db_dir():
+    """Directory holding the DB files: $DB_DIR, else next to the code."""
+    return os.path.abspath(os.getenv("DB_DIR") or BASE_DIR)
+
+
+def now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def add_missing_columns(conn, table, columns):
+    """ALTER TABLE ... ADD COLUMN for every (name, decl) not already there."""
+    have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+# ======================================================
+# Schema migrations
+# ======================================================
+# Everything is IF NOT EXISTS / add-if-missing, so a DB created by an older
+# build (or by the retired ad-hoc migrate_add_*.py / migrate_users_auth.py
+# scripts) adopts the current version in place.
+
+def m001_users(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            display_name TEXT,
+            intent TEXT,
+            auth_provider TEXT DEFAULT 'email',
+            email_verified INTEGER DEFAULT 0,
+            is_admin INTEGER DEFAULT 0,
+            created_at TEXT NOT NULL,
+            last_login TEXT
+        )
+    """)
+    # Columns older users.db files may lack
+    add_missing_columns(conn, "users", [
+        ("email", "TEXT"),
+        ("email_verified", "INTEGER DEFAULT 0"),
+        ("auth_provider", "TEXT DEFAULT 'email'"),
+        ("display_name", "TEXT"),
+        ("intent", "TEXT"),
+        ("is_admin", "INTEGER DEFAULT 0"),
+        ("created_at", "TEXT"),
+        ("last_login", "TEXT"),
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_provider_verified "
+        "ON users(auth_provider, email_verified)"
+    )
+
+
+def m002_user_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_profile (
+            user_id INTEGER PRIMARY KEY,
+            goals TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS email_otps (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            otp TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS admin_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER,
+            action TEXT,
+            target_user_id INTEGER,
+            timestamp TEXT
+        )
+    """)
+
+
+def m003_mood(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mood_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT,
+            mood TEXT,
+            message TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    # Pre-auth mood_data.db (init_db.py) had no owner column
+    add_missing_columns(conn, "mood_logs", [("user_id", "INTEGER")])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mood_user ON mood_logs(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mood_date ON mood_logs(date)")
+
+
+def m004_journal(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS journal_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT,
+            content TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    add_missing_columns(conn, "journal_entries", [("user_id", "INTEGER")])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_user ON journal_entries(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_date ON journal_entries(date)")
+
+
+def m005_journal_fts(conn):
+    """
+    FTS5 index over journal_entries.content (external content table, kept
+    in sync by triggers), built from existing rows when first created.
+    Rebuild manually with migrate_journal_fts.py.
+    """
+    try:
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_fts'"
+        ).fetchone()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5(
+                content,
+                content='journal_entries',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # sqlite built without FTS5: /search_journals keeps using LIKE
+        logger.warning("FTS5 unavailable; journal search falls back to LIKE", exc_info=True)
+        return
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS journal_fts_ai AFTER INSERT ON journal_entries BEGIN
+            INSERT INTO journal_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS journal_fts_ad AFTER DELETE ON journal_entries BEGIN
+            INSERT INTO journal_fts(journal_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS journal_fts_au AFTER UPDATE OF content ON journal_entries BEGIN
+            INSERT INTO journal_fts(journal_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO journal_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    if not existed:
+        conn.execute("INSERT INTO journal_fts(journal_fts) VALUES ('rebuild')")
+
+
+def m006_conversations(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            history TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    add_missing_columns(conn, "conversations", [("user_id", "INTEGER")])
+    # 🔹 INDEX for fast per-user queries (IMPORTANT)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conv_user ON conversations(user_id)")
+
+    # Append-only chat turns; (conv_id, seq) doubles as the "last N" index
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            conv_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            ts TEXT,
+            PRIMARY KEY (conv_id, seq),
+            FOREIGN KEY (conv_id) REFERENCES conversations(id) ON DELETE CASCADE
+        )
+    """)
+
+    # memories table for short summaries
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conv_id INTEGER NOT NULL,
+            summary TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (conv_id) REFERENCES conversations(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def m011_memory_signatures(conn):
+    # MinHash signatures for near-duplicate detection (memory_store.py);
+    # older rows get theirs from the memories.compact backfill
+    add_missing_columns(conn, "memories", [("signature", "BLOB")])
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_memories_conv_updated ON memories(conv_id, updated_at)"
+    )
+
+
+def m012_memory_terms(conn):
+    # Inverted index over memory term vectors (memory_store.search_memories).
+    # The trigger keeps it in step with every delete path, cascades included.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memory_terms (
+            conv_id INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            memory_id INTEGER NOT NULL,
+            weight REAL NOT NULL,
+            PRIMARY KEY (conv_id, term, memory_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_terms_memory ON memory_terms(memory_id)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS memories_terms_ad AFTER DELETE ON memories BEGIN
+            DELETE FROM memory_terms WHERE memory_id = old.id;
+        END
+    """)
+
+
+def m013_user_memories(conn):
+    # Cross-conversation memory (user_memory.py): one row per conversation,
+    # holding its latest summary and a float32 hashed n-gram embedding
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            conv_id INTEGER NOT NULL UNIQUE,
+            summary TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            updated_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_memories_user ON user_memories(user_id, id)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_memories_conv_ad AFTER DELETE ON conversations BEGIN
+            DELETE FROM user_memories WHERE conv_id = old.id;
+        END
+    """)
+
+
+def m014_summary_jobs(conn):
+    # Durable memory summarization queue (summary_queue.py), one row per
+    # conversation so repeated enqueues coalesce
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS summary_jobs (
+            conv_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_run_at REAL NOT NULL,
+            enqueued_at REAL,
+            claimed_at REAL,
+            dirty INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_summary_jobs_due ON summary_jobs(status, next_run_at)")
+
+
+def m015_conversation_summaries(conn):
+    # Rolling per-conversation summary and the message seq it covers, so
+    # the next summary only needs the turns after through_seq
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            conv_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            through_seq INTEGER NOT NULL,
+            updated_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS conversation_summaries_conv_ad AFTER DELETE ON conversations BEGIN
+            DELETE FROM conversation_summaries WHERE conv_id = old.id;
+        END
+    """)
+
+
+def m016_chat_requests(conn):
+    # /chat idempotency keys (idempotency.py), expired by created_at
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_requests (
+            conv_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (conv_id, key)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_requests_created ON chat_requests(created_at)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS chat_requests_conv_ad AFTER DELETE ON conversations BEGIN
+            DELETE FROM chat_requests WHERE conv_id = old.id;
+        END
+    """)
+
+
+def m017_conversation_version(conn):
+    # Bumped once by every append_messages(), which returns the new value;
+    # appends themselves are serialized by SQLite's write lock
+    add_missing_columns(conn, "conversations", [("version", "INTEGER NOT NULL DEFAULT 0")])
+
+
+def _counters(spec):
+    def run(conn):
+        create_counters(conn, spec)
+    return run
+
+
+# (version, store, name, fn), in apply order. Versions are global and never
+# reused; a DB file only records the ones for the stores it holds.
+MIGRATIONS = [
+    (1, "users", "users", m001_users),
+    (2, "users", "user_profile, email_otps, admin_logs", m002_user_tables),
+    (3, "mood", "mood_logs", m003_mood),
+    (4, "journal", "journal_entries", m004_journal),
+    (5, "journal", "journal_fts", m005_journal_fts),
+    (6, "conv", "conversations, messages, memories", m006_conversations),
+] + [
+    (7 + i, spec["store"], spec["table"], _counters(spec))
+    for i, spec in enumerate(COUNTERS)
+] + [
+    (11, "conv", "memories.signature", m011_memory_signatures),
+    (12, "conv", "memory_terms", m012_memory_terms),
+    (13, "conv", "user_memories", m013_user_memories),
+    (14, "conv", "summary_jobs", m014_summary_jobs),
+    (15, "conv", "conversation_summaries", m015_conversation_summaries),
+    (16, "conv", "chat_requests", m016_chat_requests),
+    (17, "conv", "conversation_version", m017_conversation_version),
+]
+
+
+# ======================================================
+# Backfills (online, chunked)
+# ======================================================
+# fn(conn, after_id, batch_size, **opts) handles the next chunk of rows with
+# id > after_id in its own transaction and returns the last id it looked
+# at, or None when there is nothing left.
+
+def _assign_owner(table):
+    def run(conn, after_id, batch_size, owner_id=None, **_):
+        ids = [r[0] for r in conn.execute(
+            f"SELECT id FROM {table} WHERE user_id IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (after_id, batch_size)
+        )]
+        if not ids:
+            return None
+        if owner_id is None:
+            n = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id IS NULL").fetchone()[0]
+            print(f"• {table}: {n} rows without user_id (pass --owner-id to assign them)")
+            return None
+        with conn:
+            conn.executemany(
+                f"UPDATE {table} SET user_id = ? WHERE id = ?",
+                [(owner_id, i) for i in ids]
+            )
+        return ids[-1]
+    return run
+
+
+def explode_histories(conn, after_id, batch_size, **_):
+    """Move legacy conversations.history JSON blobs into messages."""
+    rows = conn.execute(
+        """
+        SELECT id, history FROM conversations
+        WHERE id > ? AND history IS NOT NULL AND history NOT IN ('', '[]')
+        ORDER BY id
+        LIMIT ?
+        """,
+        (after_id, batch_size)
+    ).fetchall()
+    if not rows:
+        return None
+
+    with conn:
+        for conv_id, raw in rows:
+            if explode_history_blob(conn, conv_id, raw) is None:
+                print(f"• conv {conv_id}: unreadable history, leaving as is")
+    return rows[-1][0]
+
+
+def compact_memories(conn, after_id, batch_size, **_):
+    """
+    Dedupe and cap memories left over from the unbounded insert-per-turn
+    era, and index rows that predate memory_terms.
+    """
+    conv_ids = [r[0] for r in conn.execute(
+        "SELECT DISTINCT conv_id FROM memories WHERE conv_id > ? ORDER BY conv_id LIMIT ?",
+        (after_id, batch_size)
+    )]
+    if not conv_ids:
+        return None
+    with conn:
+        removed = sum(compact_conversation(conn, conv_id) for conv_id in conv_ids)
+    if removed:
+        print(f"• memories: removed {removed} redundant rows")
+    return conv_ids[-1]
+
+
+def seed_user_memories(conn, after_id, batch_size, **_):
+    """Give each conversation that has memories a user_memories row."""
+    rows = conn.execute(
+        """
+        SELECT m.conv_id, m.summary, m.updated_at FROM memories m
+        WHERE m.conv_id > ?
+          AND m.conv_id NOT IN (SELECT conv_id FROM user_memories)
+          AND m.id = (
+              SELECT id FROM memories WHERE conv_id = m.conv_id
+              ORDER BY updated_at DESC, id DESC LIMIT 1
+          )
+        ORDER BY m.conv_id
+        LIMIT ?
+        """,
+        (after_id, batch_size)
+    ).fetchall()
+    if not rows:
+        return None
+    with conn:
+        for conv_id, summary, updated_at in rows:
+            if summary:
+                remember(conn, conv_id, summary, updated_at)
+    return rows[-1][0]
+
+
+def _ownerless(table):
+    return f"SELECT COUNT(*) FROM {table} WHERE user_id IS NULL"
+
+
+# (name, store, fn, pending_sql). pending_sql counts the rows the backfill
+# still has to touch, or is None when that cannot be told without running it.
+BACKFILLS = [
+    (
+        "messages", "conv", explode_histories,
+        "SELECT COUNT(*) FROM conversations WHERE history IS NOT NULL AND history NOT IN ('', '[]')",
+    ),
+    ("memories.compact", "conv", compact_memories, None),
+    (
+        "user_memories", "conv", seed_user_memories,
+        "SELECT COUNT(DISTINCT conv_id) FROM memories "
+        "WHERE conv_id NOT IN (SELECT conv_id FROM user_memories)",
+    ),
+    ("conversations.user_id", "conv", _assign_owner("conversations"), _ownerless("conversations")),
+    ("journal_entries.user_id", "journal", _assign_owner("journal_entries"), _ownerless("journal_entries")),
+    ("mood_logs.user_id", "mood", _assign_owner("mood_logs"), _ownerless("mood_logs")),
+]
+
+
+# ======================================================
+# Runner
+# ======================================================
+def _files(db_for_store):
+    """{path: [stores]} so single mode is one file holding every store."""
+    files = {}
+    for store in STORES:
+        files.setdefault(db_for_store[store], []).append(store)
+    return files
+
+
+def latest_versions(db_for_store):
+    return {
+        path: max(v for v, store, _, _ in MIGRATIONS if store in stores)
+        for path, stores in _files(db_for_store).items()
+    }
+
+
+def current_versions(db_for_store):
+    """
+    {path: applied version} read through one connection (the other files
+    ATTACHed) and one query. Missing files or tables read as None.
+    """
+    paths = list(_files(db_for_store))
+    if not all(os.path.exists(p) for p in paths):
+        return dict.fromkeys(paths)
+
+    conn = sqlite3.connect(paths[0])
+    try:
+        schemas = ["main"]
+        for i, path in enumerate(paths[1:]):
+            conn.execute(f"ATTACH DATABASE ? AS s{i}", (path,))
+            schemas.append(f"s{i}")
+        sql = " UNION ALL ".join(
+            f"SELECT {i}, MAX(version) FROM {schema}.schema_version"
+            for i, schema in enumerate(schemas)
+        )
+        return {paths[i]: v for i, v in conn.execute(sql).fetchall()}
+    except sqlite3.OperationalError:
+        # some file has no schema_version yet
+        return dict.fromkeys(paths)
+    finally:
+        conn.close()
+
+
+def _apply(path, stores):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        # WAL is persistent in the file; pooled connections inherit it
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TEXT NOT NULL
+                )
+            """)
+            # Re-read under the write lock: another worker may have won
+            current = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            applied = []
+            for version, store, name, fn in MIGRATIONS:
+                if store not in stores or version <= current:
+                    continue
+                fn(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, now())
+                )
+                applied.append(version)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for version in applied:
+            logger.info("Applied schema migration %d to %s", version, os.path.basename(path))
+        return applied
+    finally:
+        conn.close()
+
+
+def migrate(db_for_store):
+    """Bring every DB file to the latest version; cheap when already there."""
+    latest = latest_versions(db_for_store)
+    current = current_versions(db_for_store)
+    if all(current[p] == latest[p] for p in latest):
+        return []
+
+    applied = []
+    for path, stores in _files(db_for_store).items():
+        if current[path] != latest[path]:
+            applied += _apply(path, stores)
+    return applied
+
+
+def _progress_table(conn):
+    """backfill_progress: where each backfill's last run got to."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            name TEXT PRIMARY KEY,
+            after_id INTEGER,
+            chunks INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    """)
+
+
+def _record_progress(conn, name, after_id, chunks, finished=False):
+    with conn:
+        if chunks == 0 and not finished:
+            conn.execute(
+                "INSERT OR REPLACE INTO backfill_progress (name, after_id, chunks, started_at) "
+                "VALUES (?, NULL, 0, ?)",
+                (name, now())
+            )
+        else:
+            conn.execute(
+                "UPDATE backfill_progress SET after_id = ?, chunks = ?, finished_at = ? WHERE name = ?",
+                (after_id, chunks, now() if finished else None, name)
+            )
+
+
+def run_backfills(db_for_store, batch_size=200, only=None, **opts):
+    for name, store, fn, _ in BACKFILLS:
+        if only and name not in only:
+            continue
+        conn = sqlite3.connect(db_for_store[store], timeout=30)
+        try:
+            _progress_table(conn)
+            after_id, chunks = 0, 0
+            _record_progress(conn, name, None, 0)
+            while True:
+                last = fn(conn, after_id, batch_size, **opts)
+                if last is None:
+                    break
+                after_id, chunks = last, chunks + 1
+                _record_progress(conn, name, after_id, chunks)
+                print(f"✓ {name}: up to id {after_id}")
+            _record_progress(conn, name, after_id if chunks else None, chunks, finished=True)
+            if not chunks:
+                print(f"✓ {name}: nothing to do")
+        finally:
+            conn.close()
+
+
+def backfill_status(db_for_store):
+    """
+    [(name, state, detail)] per backfill for --status. state is one of
+    'complete', 'pending' (rows left to do), 'unfinished' (the last run
+    stopped part way), 'not run' or 'missing' (no DB file).
+    """
+    out = []
+    for name, store, _, pending_sql in BACKFILLS:
+        path = db_for_store[store]
+        if not os.path.exists(path):
+            out.append((name, "missing", f"{os.path.basename(path)} not found"))
+            continue
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            run = None
+            if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'backfill_progress'"
+            ).fetchone():
+                run = conn.execute(
+                    "SELECT * FROM backfill_progress WHERE name = ?", (name,)
+                ).fetchone()
+            pending = conn.execute(pending_sql).fetchone()[0] if pending_sql else None
+        except sqlite3.OperationalError as e:
+            out.append((name, "not run", f"schema not migrated ({e})"))
+            continue
+        finally:
+            conn.close()
+
+        if run is not None and run["finished_at"] is None:
+            state = "unfinished"
+        elif pending:
+            state = "pending"
+        elif run is not None or pending == 0:
+            state = "complete"
+        else:
+            state = "not run"
+
+        detail = [f"{pending} pending" if pending is not None else "pending count unknown"]
+        if run is None:
+            detail.append("never run")
+        elif run["finished_at"] is None:
+            detail.append(
+                f"run started {run['started_at']} stopped after {run['chunks']} chunks"
+                + (f" at id {run['after_id']}" if run["after_id"] is not None else "")
+            )
+        else:
+            detail.append(f"last run finished {run['finished_at']} after {run['chunks']} chunks")
+        out.append((name, state, "; ".join(detail)))
+    return out
+
+
+def default_paths():
+    base = db_dir()
+    if os.getenv("DB_MODE", "split").lower() == "single":
+        return dict.fromkeys(STORES, os.path.join(base, "theramind.db"))
+    return {
+        "users": os.path.join(base, "users.db"),
+        "mood": os.path.join(base, "mood_data.db"),
+        "journal": os.path.join(base, "journal.db"),
+        "conv": os.path.join(base, "conversations.db"),
+    }
+
+
+def _arg(name, default=None):
+    if name in sys.argv:
+        return int(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    paths = default_paths()
+    latest = latest_versions(paths)
+    if "--status" in sys.argv:
+        for path, version in current_versions(paths).items():
+            print(f"{os.path.basename(path)}: version {version} (latest {latest[path]})")
+        for name, state, detail in backfill_status(paths):
+            print(f"{'✓' if state == 'complete' else '•'} {name}: {state} ({detail})")
+        sys.exit(0)
+
+    migrate(paths)
+    run_backfills(
+        paths,
+        batch_size=_arg("--batch-size", 200),
+        only=set(sys.argv[sys.argv.index("--only") + 1].split(",")) if "--only" in sys.argv else None,
+        owner_id=_arg("--owner-id"),
+    )
+    print("Migrations complete.")
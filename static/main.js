@@ -243,6 +243,42 @@ function appendMessage(role, content, timestamp = null) {
   chatBox.scrollTop = chatBox.scrollHeight;
 });
 
+  return div;
+}
+
+/* Bot message that fills in as tokens stream in; one DOM write per frame */
+function createStreamingMessage() {
+  const div = appendMessage("bot", "");
+  if (!div) return null;
+  const textEl = div.querySelector(".chat-text");
+  const speakBtn = div.querySelector(".speak-btn");
+  const chatBox = document.getElementById("chat-box");
+  let text = "";
+  let scheduled = false;
+
+  function render() {
+    scheduled = false;
+    textEl.textContent = " " + text;
+    chatBox.scrollTop = chatBox.scrollHeight;
+  }
+
+  return {
+    append(delta) {
+      text += delta;
+      if (!scheduled) {
+        scheduled = true;
+        requestAnimationFrame(render);
+      }
+    },
+    finish(finalText) {
+      text = finalText;
+      render();
+      if (speakBtn) speakBtn.dataset.text = finalText;
+    },
+    hasText() {
+      return text.length > 0;
+    },
+  };
 }
 
 function showTyping() {
@@ -280,9 +316,30 @@ function sendMessage() {
   input.value = "";
   showTyping();
 
+  // One key per message, reused by every retry of it: the server answers
+  // a repeat with the reply it already has (or is still producing)
+  const key = newIdempotencyKey();
+
+  if (window.ReadableStream && window.TextDecoder) {
+    streamChat(message, key).catch((err) => {
+      console.error(err);
+      showTyping();
+      postChat(message, key, CHAT_RETRIES);
+    });
+    return;
+  }
+
+  postChat(message, key, CHAT_RETRIES);
+}
+
+const CHAT_RETRIES = 2;
+const CHAT_RETRY_DELAY_MS = 1500;
+
+/* Plain JSON /chat, retried with the same idempotency key on network errors */
+function postChat(message, key, retries) {
   fetch("/chat", {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", "Idempotency-Key": key },
     body: JSON.stringify({ message }),
   })
     .then((res) => (res.ok ? res.json() : Promise.reject("Network error")))
@@ -290,10 +347,13 @@ function sendMessage() {
       hideTyping();
       const reply = data && data.reply ? sanitizeText(data.reply) : "";
       appendMessage("bot", reply || "I’m here with you.");
-    
     })
     .catch((err) => {
       console.error(err);
+      if (retries > 0) {
+        setTimeout(() => postChat(message, key, retries - 1), CHAT_RETRY_DELAY_MS);
+        return;
+      }
       hideTyping();
       appendMessage(
         "bot",
@@ -302,6 +362,80 @@ function sendMessage() {
     });
 }
 
+function newIdempotencyKey() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+}
+
+/* /chat streaming mode: "delta" events render as they arrive, "done" carries
+   the final (cleaned) reply and replaces them */
+async function streamChat(message, key) {
+  const res = await fetch("/chat", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+      "Idempotency-Key": key,
+    },
+    body: JSON.stringify({ message, stream: true }),
+  });
+  if (!res.ok || !res.body) throw new Error("Network error");
+
+  // Throttle/guard replies come back as plain JSON
+  if (!(res.headers.get("Content-Type") || "").includes("text/event-stream")) {
+    const data = await res.json();
+    hideTyping();
+    appendMessage("bot", sanitizeText(data && data.reply) || "I’m here with you.");
+    return;
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let bubble = null;
+  let finished = false;
+
+  const handle = (event, data) => {
+    if (event === "delta") {
+      if (!bubble) {
+        hideTyping();
+        bubble = createStreamingMessage();
+      }
+      if (bubble) bubble.append(data.text || "");
+    } else if (event === "done") {
+      finished = true;
+      hideTyping();
+      const reply = sanitizeText(data.reply) || "I’m here with you.";
+      if (bubble) bubble.finish(reply);
+      else appendMessage("bot", reply);
+    }
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      raw.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      if (data) handle(event, JSON.parse(data));
+    }
+  }
+
+  if (!finished) {
+    hideTyping();
+    if (!bubble || !bubble.hasText()) throw new Error("Stream ended early");
+  }
+}
+
 /* ======================================================
   🆕 CHAT CONTROLS
 ====================================================== */
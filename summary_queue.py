@@ -0,0 +1,234 @@
+import os
+import time
+import logging
+import threading
+
+from db_pool import get_pool
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable)
+POLL_INTERVAL = float(os.getenv("SUMMARY_POLL_INTERVAL", "2"))
+MAX_ATTEMPTS = int(os.getenv("SUMMARY_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("SUMMARY_BACKOFF_BASE", "5"))
+BACKOFF_MAX = float(os.getenv("SUMMARY_BACKOFF_MAX", "600"))
+LEASE_SECONDS = float(os.getenv("SUMMARY_LEASE_SECONDS", "120"))
+
+_queues = []
+
+
+class SummaryQueue:
+    """
+    Durable, per-conversation deduplicated job queue for memory
+    summarization, stored in summary_jobs (one row per conversation) and
+    drained by a background thread in each worker.
+
+    A job claimed by a worker is leased for LEASE_SECONDS; if that worker
+    dies the job becomes claimable again. A conversation enqueued while its
+    job runs is marked dirty and runs once more afterwards. Failures are
+    retried with exponential backoff up to MAX_ATTEMPTS, then parked as
+    'failed'.
+
+    The handler may return False to report that there was nothing to do
+    (counted as skipped rather than done).
+    """
+
+    def __init__(self, db_path, handler):
+        _queues.append(self)
+        self.db_path = db_path
+        self.handler = handler
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            "enqueued": 0,
+            "done": 0,
+            "skipped": 0,
+            "retried": 0,
+            "failed": 0,
+            "last_run_ms": 0.0,
+        }
+
+    def _execute(self, sql, params=()):
+        pool = get_pool(self.db_path)
+        conn = pool.acquire()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            pool.release(conn)
+
+    def enqueue(self, conv_id):
+        now = time.time()
+        self._execute(
+            """
+            INSERT INTO summary_jobs (conv_id, status, attempts, next_run_at, enqueued_at, dirty)
+            VALUES (?, 'pending', 0, ?, ?, 0)
+            ON CONFLICT(conv_id) DO UPDATE SET
+                dirty = CASE WHEN status = 'running' THEN 1 ELSE dirty END,
+                status = CASE WHEN status = 'running' THEN status ELSE 'pending' END,
+                attempts = CASE WHEN status = 'failed' THEN 0 ELSE attempts END,
+                next_run_at = CASE WHEN status = 'failed' THEN excluded.next_run_at ELSE next_run_at END
+            """,
+            (conv_id, now, now)
+        )
+        with self._lock:
+            self._stats["enqueued"] += 1
+        self._ensure_worker()
+        self._wake.set()
+
+    def resume(self):
+        """
+        Start the worker when jobs survived a restart (pending, or running
+        under a lease that will expire); otherwise the first enqueue()
+        starts it. Returns how many jobs were waiting.
+        """
+        waiting = self._execute(
+            "SELECT COUNT(*) FROM summary_jobs WHERE status IN ('pending', 'running')"
+        )[0][0]
+        if waiting:
+            self._ensure_worker()
+            self._wake.set()
+        return waiting
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="summary-worker", daemon=True
+                )
+                self._thread.start()
+
+    def _claim(self):
+        now = time.time()
+        rows = self._execute(
+            """
+            UPDATE summary_jobs
+            SET status = 'running', claimed_at = ?, attempts = attempts + 1
+            WHERE conv_id = (
+                SELECT conv_id FROM summary_jobs
+                WHERE (status = 'pending' AND next_run_at <= ?)
+                   OR (status = 'running' AND claimed_at < ?)
+                ORDER BY next_run_at
+                LIMIT 1
+            )
+            RETURNING conv_id, attempts
+            """,
+            (now, now, now - LEASE_SECONDS)
+        )
+        return tuple(rows[0]) if rows else None
+
+    def _run(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception("Summary queue claim failed")
+                job = None
+            if job is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self.run_job(*job)
+
+    def run_job(self, conv_id, attempts):
+        started = time.monotonic()
+        try:
+            ran = self.handler(conv_id)
+        except Exception as e:
+            logger.warning("Summary job for conv %s failed (attempt %d): %s", conv_id, attempts, e)
+            if attempts >= MAX_ATTEMPTS:
+                self._execute(
+                    "UPDATE summary_jobs SET status = 'failed', last_error = ? WHERE conv_id = ?",
+                    (str(e)[:500], conv_id)
+                )
+                key = "failed"
+            else:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (attempts - 1)))
+                self._execute(
+                    "UPDATE summary_jobs SET status = 'pending', next_run_at = ?, last_error = ? "
+                    "WHERE conv_id = ?",
+                    (time.time() + delay, str(e)[:500], conv_id)
+                )
+                key = "retried"
+        else:
+            self._finish(conv_id)
+            key = "skipped" if ran is False else "done"
+        with self._lock:
+            self._stats[key] += 1
+            self._stats["last_run_ms"] = round((time.monotonic() - started) * 1000.0, 2)
+
+    def _finish(self, conv_id):
+        """
+        Close a successful run: go round once more if the conversation was
+        enqueued again while running (dirty), else delete the job. Both
+        statements share one transaction, so an enqueue() cannot land
+        between them and have its dirty flag deleted with the row.
+        """
+        pool = get_pool(self.db_path)
+        conn = pool.acquire()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    UPDATE summary_jobs
+                    SET status = 'pending', dirty = 0, attempts = 0, next_run_at = ?, last_error = NULL
+                    WHERE conv_id = ? AND dirty = 1
+                    """,
+                    (time.time(), conv_id)
+                )
+                conn.execute(
+                    "DELETE FROM summary_jobs WHERE conv_id = ? AND status = 'running' AND dirty = 0",
+                    (conv_id,)
+                )
+        finally:
+            pool.release(conn)
+
+    def drain(self):
+        """Run every job that is due now, in this thread (tests, CLI)."""
+        ran = 0
+        while True:
+            job = self._claim()
+            if job is None:
+                return ran
+            self.run_job(*job)
+            ran += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+        out["by_status"] = {
+            r[0]: r[1] for r in self._execute(
+                "SELECT status, COUNT(*) FROM summary_jobs GROUP BY status"
+            )
+        }
+        out["worker_alive"] = bool(self._thread and self._thread.is_alive())
+        return out
+
+    def reset_after_fork(self):
+        # the worker thread does not survive fork; the child starts its own
+        # on enqueue() or resume()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+
+def resume_queues():
+    """resume() every queue; run once per worker after the app is loaded."""
+    for q in _queues:
+        try:
+            waiting = q.resume()
+        except Exception:
+            logger.exception("Could not resume summary queue")
+            continue
+        if waiting:
+            logger.info("Resumed summary queue with %d waiting jobs", waiting)
+
+
+def _reset_after_fork():
+    for q in _queues:
+        q.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py creates and migrates its DB files at import; keep them out of the repo
+os.environ.setdefault("DB_DIR", tempfile.mkdtemp(prefix="theramind-test-"))
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app as theramind  # noqa: E402
+
+
+@pytest.fixture
+def app_module():
+    return theramind
+
+
+@pytest.fixture
+def user_id(app_module):
+    """A fresh user row; conversations are owned per user."""
+    conn = app_module.get_pool(app_module.USER_DB).acquire()
+    try:
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO users (username, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                (f"u{os.urandom(4).hex()}", f"{os.urandom(4).hex()}@test", "x", app_module.now())
+            )
+        return cur.lastrowid
+    finally:
+        app_module.get_pool(app_module.USER_DB).release(conn)
+
+
+@pytest.fixture
+def as_user(app_module, user_id):
+    """Request context factory logged in as `user_id`."""
+    def ctx():
+        context = app_module.app.test_request_context()
+        context.push()
+        app_module.session["user_id"] = user_id
+        return context
+    return ctx
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected, llm_slot
+
+
+@pytest.fixture
+def full_queue(monkeypatch):
+    """One slot, already taken by an ordinary chat."""
+    monkeypatch.setattr(admission, "_controller", AdmissionController(max_inflight=1))
+    taken, done = threading.Event(), threading.Event()
+
+    def ordinary():
+        with llm_slot(user_id=1):
+            taken.set()
+            done.wait(5)
+
+    holder = threading.Thread(target=ordinary)
+    holder.start()
+    taken.wait(5)
+    yield
+    done.set()
+    holder.join()
+
+
+def _history(*user_turns):
+    history = []
+    for text in user_turns:
+        history += [{"role": "user", "content": text}, {"role": "model", "content": "..."}]
+    return history[:-1]
+
+
+def test_ordinary_chat_is_shed_by_a_full_queue(app_module, full_queue):
+    history = _history("how was your day", "I can't sleep")
+    assert not app_module.is_priority_message(history)
+    with pytest.raises(AdmissionRejected):
+        with llm_slot(user_id=2, priority=app_module.is_priority_message(history), timeout=0.1):
+            pass
+
+
+@pytest.mark.parametrize("turns", [
+    ("I can't breathe, my chest is tight",),
+    ("I'm short of breath", "it is still bad"),
+])
+def test_breathless_conversation_is_admitted_ahead_of_a_full_queue(app_module, full_queue, turns):
+    history = _history(*turns)
+    assert app_module.is_priority_message(history)
+    with llm_slot(user_id=2, priority=app_module.is_priority_message(history), timeout=0.1):
+        assert admission.admission_stats()["inflight"] == 2
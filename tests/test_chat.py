@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.fixture
+def client(app_module, user_id, monkeypatch):
+    monkeypatch.setattr(app_module, "call_openrouter_with_retries", lambda messages, **kwargs: "A reply.")
+    monkeypatch.setattr(app_module, "SUMMARY_EVERY_TURNS", 1)
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    client.get("/get_current_session")
+    with client.session_transaction() as sess:
+        sess["last_request"] = 0
+    return client
+
+
+@pytest.fixture
+def enqueued(app_module, monkeypatch):
+    """Messages stored for the conversation at the moment its summary was enqueued."""
+    seen = []
+
+    def enqueue(conv_id):
+        conn = app_module.get_pool(app_module.CONV_DB).acquire()
+        try:
+            seen.append(conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conv_id = ?", (conv_id,)
+            ).fetchone()[0])
+        finally:
+            app_module.get_pool(app_module.CONV_DB).release(conn)
+
+    monkeypatch.setattr(app_module.summary_jobs, "enqueue", enqueue)
+    return seen
+
+
+def test_summary_is_enqueued_after_the_turn_is_saved(client, enqueued):
+    res = client.post("/chat", json={"message": "I have been thinking about my week"})
+    assert res.get_json()["reply"] == "A reply."
+    assert enqueued == [2]
+
+
+def test_streamed_summary_is_enqueued_after_the_turn_is_saved(client, enqueued, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "stream_openrouter", lambda messages, **kwargs: iter(["A reply."]))
+    res = client.post("/chat", json={"message": "I have been thinking about my week", "stream": True})
+    assert b"event: done" in res.get_data()
+    assert enqueued == [2]
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+import llm_client
+
+STUB_DELAY = 1.0
+CHATS = 8
+
+
+class SlowOpenRouter(BaseHTTPRequestHandler):
+    """Answers every chat completion after STUB_DELAY seconds."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(STUB_DELAY)
+        out = json.dumps({"choices": [{"message": {"content": "Slow reply"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+@pytest.fixture
+def slow_stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowOpenRouter)
+    url = _serve(server)
+    monkeypatch.setattr(llm_client, "_client", llm_client.LLMClient(base_url=url, pool_size=CHATS))
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def live_app(app_module):
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    url = _serve(server)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def _logged_in_sessions(app_module, base_url, count):
+    conn = app_module.get_pool(app_module.USER_DB).acquire()
+    try:
+        with conn:
+            names = []
+            for _ in range(count):
+                name = f"c{time.monotonic_ns()}"
+                conn.execute(
+                    "INSERT INTO users (username, email, password_hash, email_verified, created_at) "
+                    "VALUES (?, ?, ?, 1, ?)",
+                    (name, f"{name}@test", generate_password_hash("pw12345678"), app_module.now())
+                )
+                names.append(name)
+    finally:
+        app_module.get_pool(app_module.USER_DB).release(conn)
+
+    sessions = []
+    for name in names:
+        s = requests.Session()
+        s.post(f"{base_url}/login", data={"email": name, "password": "pw12345678"})
+        sessions.append(s)
+    return sessions
+
+
+def test_chats_wait_on_openrouter_concurrently(app_module, slow_stub, live_app):
+    sessions = _logged_in_sessions(app_module, live_app, CHATS)
+    replies = []
+
+    def chat(s):
+        r = s.post(f"{live_app}/chat", json={"message": "hello there"}, timeout=30)
+        replies.append(r.json().get("reply"))
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=chat, args=(s,)) for s in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    took = time.monotonic() - started
+
+    assert replies == ["Slow reply"] * CHATS
+    # serialized, this would take CHATS * STUB_DELAY
+    assert took < STUB_DELAY * 3
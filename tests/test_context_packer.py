@@ -0,0 +1,39 @@
+from context_packer import ContextPacker, estimate_tokens
+
+
+def _system(tokens):
+    return {"role": "system", "content": "word " * (tokens * 4 // 5)}
+
+
+HISTORY = [
+    {"role": "user", "content": "earlier message " * 20},
+    {"role": "model", "content": "earlier reply " * 20},
+    {"role": "user", "content": "I had a rough day at work and I keep replaying it " * 8},
+]
+
+
+def test_history_fills_the_budget_newest_first():
+    messages, report = ContextPacker(budget=200, per_msg_max=300).pack([_system(50)], HISTORY)
+    assert messages[-1]["content"] == HISTORY[-1]["content"].strip()
+    assert report["dropped"] >= 1
+    assert report["prompt_tokens"] <= 200
+
+
+def test_memory_blocks_give_way_to_the_latest_turn():
+    prefix = [_system(50), _system(300), _system(300)]
+    messages, report = ContextPacker(budget=200, latest_min=64).pack(prefix, HISTORY)
+
+    assert messages[0] is prefix[0]
+    assert report["prefix_dropped"] == 2
+    assert estimate_tokens(messages[-1]["content"]) >= 64
+    assert report["prompt_tokens"] <= 200
+
+
+def test_prefix_larger_than_the_budget_keeps_the_latest_turn():
+    packer = ContextPacker(budget=100, latest_min=64)
+    messages, report = packer.pack([_system(500)], HISTORY)
+
+    assert messages[-1]["role"] == "user"
+    assert estimate_tokens(messages[-1]["content"]) >= 64
+    assert report["prompt_tokens"] > report["budget"]
+    assert packer.stats()["over_budget"] == 1
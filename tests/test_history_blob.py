@@ -0,0 +1,43 @@
+import json
+import sqlite3
+
+import pytest
+
+from history_blob import explode_history_blob
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE conversations (id INTEGER PRIMARY KEY, history TEXT)")
+    conn.execute(
+        "CREATE TABLE messages (conv_id INTEGER, seq INTEGER, role TEXT, content TEXT, ts TEXT, "
+        "PRIMARY KEY (conv_id, seq))"
+    )
+    return conn
+
+
+def test_blob_moves_into_messages(conn):
+    blob = json.dumps([
+        {"role": "user", "content": "hi", "ts": "t0"},
+        "not a turn",
+        {"role": "model", "content": None},
+    ])
+    conn.execute("INSERT INTO conversations (id, history) VALUES (1, ?)", (blob,))
+
+    assert explode_history_blob(conn, 1, blob) == 3
+
+    assert conn.execute("SELECT seq, role, content, ts FROM messages ORDER BY seq").fetchall() == [
+        (0, "user", "hi", "t0"),
+        (2, "model", "", None),
+    ]
+    assert conn.execute("SELECT history FROM conversations").fetchone() == ("[]",)
+
+
+def test_unreadable_blob_is_left_alone(conn):
+    conn.execute("INSERT INTO conversations (id, history) VALUES (1, '[{broken')")
+
+    assert explode_history_blob(conn, 1, "[{broken") is None
+
+    assert conn.execute("SELECT COUNT(*) FROM messages").fetchone() == (0,)
+    assert conn.execute("SELECT history FROM conversations").fetchone() == ("[{broken",)
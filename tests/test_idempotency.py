@@ -0,0 +1,132 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+THROTTLED = "I’m still finishing the last message. Just a moment, then you can send again. 💙"
+
+
+@pytest.fixture
+def client(app_module, user_id, monkeypatch):
+    replies = itertools.count(1)
+    monkeypatch.setattr(
+        app_module, "generate_reply_with_context",
+        lambda history, **kwargs: (f"reply {next(replies)}", None)
+    )
+    monkeypatch.setattr(app_module, "update_memory", lambda *args, **kwargs: None)
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    # first request creates the conversation the keys are scoped to
+    client.get("/get_current_session")
+    with client.session_transaction() as sess:
+        sess["last_request"] = 0
+    return client
+
+
+def _chat(client, message, key):
+    return client.post("/chat", json={"message": message}, headers={"Idempotency-Key": key}).get_json()
+
+
+def test_new_keys_are_throttled(client):
+    assert _chat(client, "first", "key-a")["reply"] == "reply 1"
+    assert _chat(client, "second", "key-b")["reply"] == THROTTLED
+
+
+def test_repeat_of_a_claimed_key_skips_the_throttle(client):
+    assert _chat(client, "hello", "key-c")["reply"] == "reply 1"
+    assert _chat(client, "hello", "key-c")["reply"] == "reply 1"
+
+
+def test_keyed_chat_fits_a_single_connection_pool(app_module, client, monkeypatch):
+    pool = app_module.get_pool(app_module.CONV_DB)
+    pool.close_all()
+    monkeypatch.setattr(pool, "max_size", 1)
+    monkeypatch.setattr(pool, "timeout", 0.5)
+
+    res = client.post("/chat", json={"message": "hello"}, headers={"Idempotency-Key": "key-d"})
+
+    assert res.status_code == 200
+    assert res.get_json()["reply"] == "reply 1"
+
+
+def _message_count(app_module, client):
+    with client.session_transaction() as sess:
+        conv_id = sess["conv_id"]
+    conn = app_module.get_pool(app_module.CONV_DB).acquire()
+    try:
+        return conv_id, conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE conv_id = ?", (conv_id,)
+        ).fetchone()[0]
+    finally:
+        app_module.get_pool(app_module.CONV_DB).release(conn)
+
+
+def test_replay_of_a_completed_key_returns_the_stored_reply(app_module, client):
+    assert _chat(client, "hello", "key-e")["reply"] == "reply 1"
+
+    assert _chat(client, "hello", "key-e")["reply"] == "reply 1"
+
+    _, stored = _message_count(app_module, client)
+    assert stored == 2
+    with client.session_transaction() as sess:
+        sess["last_request"] = 0
+    # the replay made no LLM call of its own
+    assert _chat(client, "next", "key-f")["reply"] == "reply 2"
+
+
+def test_concurrent_retry_of_a_pending_key_is_coalesced(app_module, client, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_reply(history, **kwargs):
+        calls.append(history[-1]["content"])
+        started.set()
+        release.wait(5)
+        return "slow reply", None
+
+    monkeypatch.setattr(app_module, "generate_reply_with_context", slow_reply)
+    with client.session_transaction() as sess:
+        cookie_session = dict(sess)
+    retry_client = app_module.app.test_client()
+    with retry_client.session_transaction() as sess:
+        sess.update(cookie_session)
+
+    first = {}
+    owner = threading.Thread(target=lambda: first.update(_chat(client, "hello", "key-h")))
+    owner.start()
+    assert started.wait(5)
+
+    retried = {}
+    retry = threading.Thread(target=lambda: retried.update(_chat(retry_client, "hello", "key-h")))
+    retry.start()
+    time.sleep(0.3)
+    release.set()
+    owner.join(5)
+    retry.join(5)
+
+    assert first["reply"] == retried["reply"] == "slow reply"
+    assert calls == ["hello"]
+    assert app_module.chat_requests.stats()["coalesced"] >= 1
+
+
+def test_failed_request_frees_its_key_for_a_retry(app_module, client, monkeypatch):
+    def broken(history, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app_module, "generate_reply_with_context", broken)
+    client.application.testing = False
+    try:
+        assert client.post("/chat", json={"message": "hello"},
+                           headers={"Idempotency-Key": "key-i"}).status_code == 500
+    finally:
+        client.application.testing = True
+
+    with client.session_transaction() as sess:
+        conv_id = sess["conv_id"]
+        sess["last_request"] = 0
+    assert not app_module.chat_requests.seen(conv_id, "key-i")
+
+    monkeypatch.setattr(app_module, "generate_reply_with_context", lambda history, **kwargs: ("retried", None))
+    assert _chat(client, "hello", "key-i")["reply"] == "retried"
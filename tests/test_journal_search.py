@@ -0,0 +1,42 @@
+import pytest
+
+
+@pytest.fixture
+def client(app_module, user_id):
+    conn = app_module.get_pool(app_module.JOURNAL_DB).acquire()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO journal_entries (user_id, date, content) VALUES (?, ?, ?)",
+                [
+                    (user_id, "2026-01-01", "A day full of happiness"),
+                    (user_id, "2026-01-02", "Some loneliness today"),
+                    (user_id, "2026-01-03", "Went for a walk"),
+                ]
+            )
+    finally:
+        app_module.get_pool(app_module.JOURNAL_DB).release(conn)
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    return client
+
+
+def test_default_search_matches_substrings(client):
+    rows = client.get("/search_journals?q=ness").get_json()
+    assert rows == [["2026-01-02", "Some loneliness today"], ["2026-01-01", "A day full of happiness"]]
+
+
+def test_default_search_without_query_lists_everything(client):
+    assert len(client.get("/search_journals").get_json()) == 3
+
+
+def test_ranked_search_is_paginated(app_module, client):
+    with app_module.app.app_context():
+        fts = app_module.journal_fts_enabled()
+    if not fts:
+        pytest.skip("sqlite built without FTS5")
+    data = client.get("/search_journals?mode=ranked&q=walk&per_page=1").get_json()
+    assert [r["date"] for r in data["results"]] == ["2026-01-03"]
+    assert "<mark>walk</mark>" in data["results"][0]["snippet"].lower()
+    assert data["has_more"] is False
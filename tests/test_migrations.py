@@ -0,0 +1,77 @@
+import os
+import sqlite3
+
+import pytest
+
+import migrations
+from migrations import backfill_status, default_paths, migrate, run_backfills
+
+
+def test_default_paths_follow_db_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_DIR", str(tmp_path))
+    monkeypatch.setenv("DB_MODE", "split")
+    assert default_paths()["conv"] == os.path.join(str(tmp_path), "conversations.db")
+
+    monkeypatch.setenv("DB_MODE", "single")
+    assert set(default_paths().values()) == {os.path.join(str(tmp_path), "theramind.db")}
+
+
+def test_app_and_migrations_agree_on_paths(app_module):
+    paths = default_paths()
+    assert paths["conv"] == app_module.CONV_DB
+    assert paths["users"] == app_module.USER_DB
+
+
+def _stores(tmp_path):
+    return {store: str(tmp_path / f"{store}.db") for store in ("users", "mood", "journal", "conv")}
+
+
+def _state(paths):
+    return {name: state for name, state, _ in backfill_status(paths)}
+
+
+def _legacy_conversations(paths, count):
+    conn = sqlite3.connect(paths["conv"])
+    with conn:
+        conn.executemany(
+            "INSERT INTO conversations (user_id, title, history, created_at) VALUES (1, 't', ?, 'x')",
+            [('[{"role": "user", "content": "hi"}]',)] * count
+        )
+    conn.close()
+
+
+def test_backfill_status_tracks_pending_and_finished_runs(tmp_path):
+    paths = _stores(tmp_path)
+    migrate(paths)
+    _legacy_conversations(paths, 1)
+
+    before = _state(paths)
+    assert before["messages"] == "pending"
+    assert before["memories.compact"] == "not run"
+
+    run_backfills(paths)
+
+    assert set(_state(paths).values()) == {"complete"}
+
+
+def test_backfill_status_reports_an_interrupted_run(tmp_path, monkeypatch):
+    paths = _stores(tmp_path)
+    migrate(paths)
+    _legacy_conversations(paths, 5)
+
+    def dies_after_one_chunk(conn, after_id, batch_size, **opts):
+        if after_id:
+            raise KeyboardInterrupt
+        return migrations.explode_histories(conn, after_id, batch_size, **opts)
+
+    monkeypatch.setattr(migrations, "BACKFILLS", [
+        (name, store, dies_after_one_chunk if name == "messages" else fn, sql)
+        for name, store, fn, sql in migrations.BACKFILLS
+    ])
+    with pytest.raises(KeyboardInterrupt):
+        run_backfills(paths, batch_size=2, only={"messages"})
+
+    status = {name: (state, detail) for name, state, detail in backfill_status(paths)}
+    state, detail = status["messages"]
+    assert state == "unfinished"
+    assert "3 pending" in detail and "stopped after 1 chunks at id 2" in detail
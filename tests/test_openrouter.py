@@ -0,0 +1,45 @@
+import pytest
+import requests
+
+import circuit_breaker
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    fresh = circuit_breaker.CircuitBreaker()
+    monkeypatch.setattr(circuit_breaker, "_breaker", fresh)
+    return fresh
+
+
+def _call(app_module, monkeypatch, status):
+    monkeypatch.setattr(app_module, "llm_post", lambda *args, **kwargs: FakeResponse(status))
+    return app_module._call_openrouter("/chat/completions", {}, {}, retries=0, timeout=5)
+
+
+def test_client_errors_leave_the_breaker_alone(app_module, monkeypatch, breaker):
+    with pytest.raises(requests.HTTPError):
+        _call(app_module, monkeypatch, 503)
+    with pytest.raises(requests.HTTPError):
+        _call(app_module, monkeypatch, 400)
+
+    stats = breaker.stats()
+    assert stats["consecutive_failures"] == 1
+    assert stats["successes"] == 0
+    assert stats["samples"] == 0
+
+
+def test_success_is_recorded(app_module, monkeypatch, breaker):
+    assert _call(app_module, monkeypatch, 200)
+    assert breaker.stats()["successes"] == 1
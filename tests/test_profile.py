@@ -0,0 +1,50 @@
+import pytest
+
+
+@pytest.fixture
+def profile_stats(app_module, user_id, monkeypatch):
+    """Calls /profile and returns what it passed to the template."""
+    rendered = {}
+
+    def render(template, **context):
+        rendered.update(context)
+        return ""
+
+    monkeypatch.setattr(app_module, "render_template", render)
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+    def get():
+        rendered.clear()
+        client.get("/profile")
+        return rendered
+    return get
+
+
+def _log_moods(app_module, user_id, rows):
+    conn = app_module.get_pool(app_module.MOOD_DB).acquire()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO mood_logs (user_id, date, mood) VALUES (?, ?, ?)",
+                [(user_id, date, mood) for date, mood in rows]
+            )
+    finally:
+        app_module.get_pool(app_module.MOOD_DB).release(conn)
+
+
+def test_last_mood_skips_an_undated_newest_entry(app_module, user_id, profile_stats):
+    _log_moods(app_module, user_id, [("2026-01-01 09:00:00", "calm"), (None, "tired")])
+    assert profile_stats()["last_mood"] == {"mood": "calm", "date": "2026-01-01 09:00:00"}
+
+
+def test_last_mood_falls_back_to_undated_entries(app_module, user_id, profile_stats):
+    _log_moods(app_module, user_id, [(None, "tired")])
+    assert profile_stats()["last_mood"] == {"mood": "tired", "date": None}
+
+
+def test_no_moods_means_no_last_mood(profile_stats):
+    stats = profile_stats()
+    assert stats["last_mood"] is None
+    assert stats["stats"]["moods"] == 0
@@ -0,0 +1,138 @@
+import threading
+
+
+def _new_conversation(app_module, as_user):
+    ctx = as_user()
+    try:
+        return app_module.create_empty_conversation()
+    finally:
+        ctx.pop()
+
+
+def _append_concurrently(app_module, as_user, conv_id, threads, rounds):
+    barrier = threading.Barrier(threads)
+    versions, errors = [], []
+
+    def worker(n):
+        ctx = as_user()
+        try:
+            barrier.wait()
+            for i in range(rounds):
+                versions.append(app_module.append_messages(conv_id, [
+                    {"role": "user", "content": f"t{n}-{i}"},
+                    {"role": "model", "content": f"r{n}-{i}"},
+                ]))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            ctx.pop()
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    assert not errors
+    return versions
+
+
+def _messages(app_module, conv_id):
+    conn = app_module.get_pool(app_module.CONV_DB).acquire()
+    try:
+        return conn.execute(
+            "SELECT seq, role, content FROM messages WHERE conv_id = ? ORDER BY seq",
+            (conv_id,)
+        ).fetchall()
+    finally:
+        app_module.get_pool(app_module.CONV_DB).release(conn)
+
+
+def test_two_threads_appending_keep_both_turns(app_module, as_user):
+    conv_id = _new_conversation(app_module, as_user)
+
+    versions = _append_concurrently(app_module, as_user, conv_id, threads=2, rounds=1)
+
+    rows = _messages(app_module, conv_id)
+    assert sorted(r["content"] for r in rows) == ["r0-0", "r1-0", "t0-0", "t1-0"]
+    assert [r["seq"] for r in rows] == [0, 1, 2, 3]
+    assert sorted(versions) == [1, 2]
+
+
+def test_concurrent_appends_stay_paired_and_versioned(app_module, as_user):
+    conv_id = _new_conversation(app_module, as_user)
+
+    versions = _append_concurrently(app_module, as_user, conv_id, threads=4, rounds=10)
+
+    rows = _messages(app_module, conv_id)
+    assert len(rows) == 80
+    assert [r["seq"] for r in rows] == list(range(80))
+    # each call's user turn is directly followed by its own reply
+    for user_row, model_row in zip(rows[::2], rows[1::2]):
+        assert user_row["role"] == "user" and model_row["role"] == "model"
+        assert model_row["content"] == "r" + user_row["content"][1:]
+    assert sorted(versions) == list(range(1, 41))
+
+
+def test_append_to_someone_elses_conversation_is_refused(app_module, as_user, user_id):
+    conv_id = _new_conversation(app_module, as_user)
+    ctx = app_module.app.test_request_context()
+    ctx.push()
+    try:
+        app_module.session["user_id"] = user_id + 1000
+        assert app_module.append_messages(conv_id, [{"role": "user", "content": "x"}]) is None
+    finally:
+        ctx.pop()
+    assert _messages(app_module, conv_id) == []
+
+
+def _leftovers(app_module, conv_id):
+    conn = app_module.get_pool(app_module.CONV_DB).acquire()
+    try:
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE conv_id = ?", (conv_id,)).fetchone()[0]
+            for table in app_module.CONV_CHILD_TABLES
+        }
+    finally:
+        app_module.get_pool(app_module.CONV_DB).release(conn)
+
+
+def _with_queue_rows(app_module, as_user, conv_id):
+    app_module.summary_jobs._execute(
+        "INSERT INTO summary_jobs (conv_id, status, attempts, next_run_at) VALUES (?, 'failed', 5, 0)",
+        (conv_id,)
+    )
+    app_module.chat_requests._execute(
+        "INSERT INTO chat_requests (conv_id, key, status, created_at) VALUES (?, 'k', 'done', 0)",
+        (conv_id,)
+    )
+    ctx = as_user()
+    try:
+        app_module.append_messages(conv_id, [{"role": "user", "content": "hi"}])
+    finally:
+        ctx.pop()
+
+
+def test_deleting_a_conversation_clears_its_queue_rows(app_module, as_user):
+    conv_id = _new_conversation(app_module, as_user)
+    _with_queue_rows(app_module, as_user, conv_id)
+
+    ctx = as_user()
+    try:
+        app_module.delete_conversation(conv_id)
+    finally:
+        ctx.pop()
+
+    assert set(_leftovers(app_module, conv_id).values()) == {0}
+
+
+def test_admin_deleting_a_user_clears_their_queue_rows(app_module, as_user, user_id):
+    conv_id = _new_conversation(app_module, as_user)
+    _with_queue_rows(app_module, as_user, conv_id)
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id + 10_000
+        sess["is_admin"] = True
+    assert client.delete(f"/admin/delete_user/{user_id}").get_json()["status"] == "ok"
+
+    assert set(_leftovers(app_module, conv_id).values()) == {0}
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from migrations import migrate
+from summary_queue import LEASE_SECONDS, SummaryQueue
+
+
+@pytest.fixture
+def conv_db(tmp_path):
+    stores = {store: str(tmp_path / f"{store}.db") for store in ("users", "mood", "journal", "conv")}
+    migrate(stores)
+    return stores["conv"]
+
+
+def _queue(conv_db):
+    ran = []
+    done = threading.Event()
+
+    def handler(conv_id):
+        ran.append(conv_id)
+        done.set()
+
+    return SummaryQueue(conv_db, handler), ran, done
+
+
+def _insert_job(queue, conv_id, status, claimed_at=None):
+    queue._execute(
+        "INSERT INTO summary_jobs (conv_id, status, attempts, next_run_at, enqueued_at, dirty, claimed_at) "
+        "VALUES (?, ?, 0, ?, ?, 0, ?)",
+        (conv_id, status, time.time(), time.time(), claimed_at)
+    )
+
+
+def test_resume_without_jobs_starts_no_worker(conv_db):
+    queue, _, _ = _queue(conv_db)
+    assert queue.resume() == 0
+    assert queue.stats()["worker_alive"] is False
+
+
+def test_resume_runs_jobs_left_from_a_previous_run(conv_db):
+    queue, ran, done = _queue(conv_db)
+    _insert_job(queue, 7, "pending")
+
+    assert queue.resume() == 1
+    assert done.wait(5)
+    assert ran == [7]
+
+
+def test_resume_reclaims_jobs_whose_lease_expired(conv_db):
+    queue, ran, done = _queue(conv_db)
+    _insert_job(queue, 9, "running", claimed_at=time.time() - LEASE_SECONDS - 1)
+
+    assert queue.resume() == 1
+    assert done.wait(5)
+    assert ran == [9]
+
+
+def test_enqueue_while_running_runs_the_job_again(conv_db, monkeypatch):
+    ran = []
+
+    def handler(conv_id):
+        ran.append(conv_id)
+        if len(ran) == 1:
+            queue.enqueue(conv_id)
+
+    queue = SummaryQueue(conv_db, handler)
+    # drain() alone runs the jobs here, no background worker
+    monkeypatch.setattr(queue, "_ensure_worker", lambda: None)
+    _insert_job(queue, 5, "pending")
+
+    assert queue.drain() == 2
+    assert ran == [5, 5]
+    assert queue._execute("SELECT COUNT(*) FROM summary_jobs")[0][0] == 0
@@ -0,0 +1,181 @@
+"""
+User-level long-term memory across conversations.
+
+Every conversation contributes its latest summary to user_memories, with a
+hashed n-gram embedding (word unigrams + bigrams, signed feature hashing
+into USER_MEMORY_DIM buckets, L2-normalized, float32) stored next to it.
+
+Per worker, each user's embeddings are held as one contiguous float32
+matrix, so a lookup is a single matrix-vector product. The cache is
+refreshed incrementally: only rows with an id above the cached watermark
+are read and appended. A rewritten summary gets a new id (INSERT OR
+REPLACE), which replaces that conversation's cached row.
+"""
+import os
+import re
+import zlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+USER_MEMORY_DIM = int(os.getenv("USER_MEMORY_DIM", "512"))
+USER_MEMORY_MAX = int(os.getenv("USER_MEMORY_MAX", "200"))
+USER_MEMORY_MIN_SCORE = float(os.getenv("USER_MEMORY_MIN_SCORE", "0.2"))
+USER_MEMORY_CACHE_USERS = int(os.getenv("USER_MEMORY_CACHE_USERS", "256"))
+
+_WORD_RE = re.compile(r"\b[a-zA-Z']{2,}\b")
+
+
+def embed(text, dim=USER_MEMORY_DIM):
+    """Signed hashed bag of word unigrams and bigrams, unit length."""
+    words = _WORD_RE.findall((text or "").lower())
+    vec = np.zeros(dim, dtype=np.float32)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for gram in grams:
+        h = zlib.crc32(gram.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm:
+        vec /= norm
+    return vec
+
+
+def remember(conn, conv_id, summary, ts):
+    """
+    Record conv_id's latest summary for its owner and trim the owner to the
+    newest USER_MEMORY_MAX. Runs in the caller's transaction.
+    """
+    row = conn.execute("SELECT user_id FROM conversations WHERE id = ?", (conv_id,)).fetchone()
+    if not row or row[0] is None:
+        return
+    user_id = row[0]
+    conn.execute(
+        "INSERT OR REPLACE INTO user_memories (user_id, conv_id, summary, embedding, updated_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (user_id, conv_id, summary, embed(summary).tobytes(), ts)
+    )
+    conn.execute(
+        """
+        DELETE FROM user_memories
+        WHERE user_id = ? AND id NOT IN (
+            SELECT id FROM user_memories WHERE user_id = ? ORDER BY id DESC LIMIT ?
+        )
+        """,
+        (user_id, user_id, USER_MEMORY_MAX)
+    )
+
+
+class _UserMatrix:
+    __slots__ = ("ids", "conv_ids", "summaries", "matrix", "last_id")
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.conv_ids = np.zeros(0, dtype=np.int64)
+        self.summaries = []
+        self.matrix = np.zeros((0, USER_MEMORY_DIM), dtype=np.float32)
+        self.last_id = 0
+
+    def copy(self):
+        other = _UserMatrix()
+        other.ids, other.conv_ids, other.summaries = self.ids, self.conv_ids, self.summaries
+        other.matrix, other.last_id = self.matrix, self.last_id
+        return other
+
+    def append(self, rows):
+        """rows: (id, conv_id, summary, embedding) with ascending ids."""
+        if not rows:
+            return
+        new_convs = np.array([r[1] for r in rows], dtype=np.int64)
+        keep = ~np.isin(self.conv_ids, new_convs)
+        self.ids = np.concatenate([self.ids[keep], np.array([r[0] for r in rows], dtype=np.int64)])
+        self.conv_ids = np.concatenate([self.conv_ids[keep], new_convs])
+        self.summaries = [s for s, k in zip(self.summaries, keep) if k] + [r[2] for r in rows]
+        block = np.frombuffer(b"".join(r[3] for r in rows), dtype=np.float32)
+        self.matrix = np.vstack([self.matrix[keep], block.reshape(len(rows), -1)])
+        self.last_id = int(self.ids[-1])
+
+
+class UserMemoryIndex:
+    """Per-worker LRU of user matrices, kept in step with user_memories."""
+
+    def __init__(self, max_users=USER_MEMORY_CACHE_USERS):
+        self.max_users = max(1, max_users)
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, conn, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                self._users.move_to_end(user_id)
+
+        count = conn.execute(
+            "SELECT COUNT(*) FROM user_memories WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+        if entry is None or count < len(entry.ids):
+            entry = _UserMatrix()
+        else:
+            # append() swaps arrays rather than mutating them, so a shallow
+            # copy keeps readers of the cached entry consistent
+            entry = entry.copy()
+        entry.append(self._rows(conn, user_id, entry.last_id))
+        if len(entry.ids) != count:
+            # rows were deleted or trimmed since the last refresh
+            entry = _UserMatrix()
+            entry.append(self._rows(conn, user_id, 0))
+
+        with self._lock:
+            self._users[user_id] = entry
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _rows(conn, user_id, after_id):
+        return [tuple(r) for r in conn.execute(
+            "SELECT id, conv_id, summary, embedding FROM user_memories "
+            "WHERE user_id = ? AND id > ? ORDER BY id",
+            (user_id, after_id)
+        )]
+
+    def search(self, conn, user_id, query, top_k=3, exclude_conv_id=None):
+        entry = self._load(conn, user_id)
+        if not len(entry.ids):
+            return []
+        scores = entry.matrix @ embed(query)
+        if exclude_conv_id is not None:
+            scores[entry.conv_ids == exclude_conv_id] = -1.0
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [entry.summaries[i] for i in best if scores[i] >= USER_MEMORY_MIN_SCORE]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "rows": int(sum(len(e.ids) for e in self._users.values())),
+            }
+
+
+_index = UserMemoryIndex()
+
+
+def search_user_memories(conn, user_id, query, top_k=3, exclude_conv_id=None):
+    """Best matching summaries from the user's other conversations."""
+    return _index.search(conn, user_id, query, top_k=top_k, exclude_conv_id=exclude_conv_id)
+
+
+def user_memory_stats():
+    return _index.stats()
+
+
+def _reset_after_fork():
+    global _index
+    _index = UserMemoryIndex()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
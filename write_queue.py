@@ -0,0 +1,163 @@
+import os
+import atexit
+import logging
+import threading
+import time
+
+from db_pool import get_pool
+
+logger = logging.getLogger("theramind")
+
+# Tunables (env overridable)
+FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL_MS", "250")) / 1000.0
+FLUSH_MAX = int(os.getenv("WRITE_FLUSH_MAX", "200"))
+
+
+class WriteBehindQueue:
+    """
+    Per-worker group-commit queue for writes nobody waits on (last_login,
+    memory summaries, audit rows). Statements are buffered and applied by a
+    background thread in one transaction per DB file, every FLUSH_INTERVAL
+    or as soon as FLUSH_MAX statements are pending, whichever comes first.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=FLUSH_MAX):
+        self.interval = interval
+        self.max_pending = max(1, max_pending)
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "errors": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def enqueue(self, db_path, sql, params=()):
+        """`sql` may also be a callable, applied as sql(conn, *params)."""
+        with self._cond:
+            self._pending.append((db_path, sql, tuple(params)))
+            self._stats["enqueued"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="write-behind", daemon=True
+                )
+                self._thread.start()
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self.max_pending:
+                    self._cond.wait(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def flush(self):
+        """Write everything pending now; returns the number of statements applied."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            by_db = {}
+            for db_path, sql, params in batch:
+                by_db.setdefault(db_path, []).append((sql, params))
+
+            written = 0
+            for db_path, statements in by_db.items():
+                written += self._write(db_path, statements)
+
+            with self._cond:
+                self._stats["written"] += written
+                self._stats["batches"] += 1
+                self._stats["last_flush_ms"] = round((time.monotonic() - started) * 1000.0, 2)
+            return written
+
+    def _write(self, db_path, statements):
+        pool = get_pool(db_path)
+        conn = pool.acquire()
+        try:
+            try:
+                with conn:
+                    for sql, params in statements:
+                        self._apply(conn, sql, params)
+                return len(statements)
+            except Exception:
+                logger.warning(
+                    "Group commit to %s failed, retrying %d writes one by one",
+                    os.path.basename(db_path), len(statements)
+                )
+
+            # One bad row (e.g. a memory for a conversation deleted meanwhile)
+            # must not cost the rest of the batch
+            written = 0
+            for sql, params in statements:
+                try:
+                    with conn:
+                        self._apply(conn, sql, params)
+                    written += 1
+                except Exception:
+                    logger.exception("Dropping deferred write: %s", self._describe(sql))
+                    with self._cond:
+                        self._stats["errors"] += 1
+            return written
+        finally:
+            pool.release(conn)
+
+    @staticmethod
+    def _apply(conn, sql, params):
+        if callable(sql):
+            sql(conn, *params)
+        else:
+            conn.execute(sql, params)
+
+    @staticmethod
+    def _describe(sql):
+        return getattr(sql, "__name__", None) or sql.split("(")[0].strip()
+
+    def stats(self):
+        with self._cond:
+            out = dict(self._stats)
+            out["depth"] = len(self._pending)
+        return out
+
+
+# ======================================================
+# Per-worker instance
+# ======================================================
+_queue = WriteBehindQueue()
+
+
+def defer_write(db_path, sql, params=()):
+    _queue.enqueue(db_path, sql, params)
+
+
+def flush_writes():
+    """Synchronous flush (shutdown, tests, or before reading deferred rows back)."""
+    return _queue.flush()
+
+
+def write_queue_stats():
+    return _queue.stats()
+
+
+def _reset_after_fork():
+    # The flusher thread does not survive fork; a worker starts its own
+    # queue (and thread, lazily) rather than replaying the parent's rows.
+    global _queue
+    _queue = WriteBehindQueue()
+
+
+atexit.register(flush_writes)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)